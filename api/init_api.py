@@ -1,18 +1,42 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
 import pydantic
 from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi_jwt_auth.exceptions import AuthJWTException
-from sqlmodel import SQLModel
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.gzip import GZipMiddleware
 from starlette.responses import JSONResponse
 
-from api.routes import user_router
-from clients.database import engine
+from api.middlewares import (
+    ConcurrencyLimiter,
+    LoadSheddingMiddleware,
+    MetricsMiddleware,
+)
+from api.routes import metrics_router, user_router
+from clients import database
+from clients.redis import prewarm_redis_pool
 from config import Config
-from utils.errors import UserAlreadyExistError, UserDoesNotExistError
+from services.caching import CachingService
+from services.hashing import HasherService
+from services.metrics import STARTUP_DURATION
+from services.user import user_hits
+from services.user_filter import user_filter
+from services.warmup import WarmupService
+from utils.errors import (
+    HashingQueueFullError,
+    UserAlreadyExistError,
+    UserDoesNotExistError,
+)
+
+logger = logging.getLogger(__name__)
 
 
 def init_api(config: Config):
+    created_at = time.perf_counter()
     app = FastAPI(
         title="Sidus API",
         description="",
@@ -20,28 +44,93 @@ def init_api(config: Config):
         docs_url="/",
         redoc_url="/docs",
         openapi_tags=[],
+        default_response_class=ORJSONResponse,
     )
     # pass config object to application
     app.config = config
 
     _cors(app)
     _gzip(app)
+    _load_shedding(app, config)
+    _metrics(app)
     _routes(app)
 
     _register_exception_handlers(app)
 
     @app.on_event("startup")
     async def startup_event():
-        # create database and table
-        SQLModel.metadata.create_all(engine)
+        # the schema is created by `api/migrate.py` before workers start
+        await asyncio.gather(
+            _prewarm(
+                "database",
+                lambda: database.prewarm_database_pool(
+                    config.DATABASE_PREWARM_CONNECTIONS
+                ),
+            ),
+            *(
+                _prewarm(
+                    f"database_replica_{number}",
+                    lambda replica=replica: database.prewarm_database_pool(
+                        config.DATABASE_PREWARM_CONNECTIONS, replica
+                    ),
+                )
+                for number, replica in enumerate(database.replicas.engines)
+            ),
+            _prewarm(
+                "redis",
+                lambda: prewarm_redis_pool(config.REDIS_PREWARM_CONNECTIONS),
+            ),
+        )
+        # reset in-process cache of this worker when other workers change data
+        app.state.cache_invalidation_listener = asyncio.create_task(
+            CachingService.listen_invalidations()
+        )
+        # share read counts of users with warm-up
+        app.state.hot_users_flusher = asyncio.create_task(
+            user_hits.flush_forever(config.HOT_USERS_FLUSH_INTERVAL)
+        )
+        if config.USER_FILTER_ENABLED:
+            # lookups don't use the filter until it is built
+            app.state.user_filter_build = asyncio.create_task(
+                user_filter.build_or_skip()
+            )
+        if config.WARMUP_ON_STARTUP:
+            # doesn't delay readiness, requests are served as it goes
+            app.state.cache_warmup = asyncio.create_task(
+                WarmupService.warm_up_once_per_deploy()
+            )
+        ready_in = time.perf_counter() - created_at
+        STARTUP_DURATION.set(ready_in, "total")
+        logger.info("worker is ready", extra={"ready_in": round(ready_in, 3)})
 
     @app.on_event("shutdown")
     async def shutdown_event():
-        pass
+        app.state.cache_invalidation_listener.cancel()
+        app.state.hot_users_flusher.cancel()
+        if config.USER_FILTER_ENABLED:
+            app.state.user_filter_build.cancel()
+        if config.WARMUP_ON_STARTUP:
+            app.state.cache_warmup.cancel()
+        HasherService.shutdown()
+        await database.engine.dispose()
+        await database.replicas.dispose()
 
     return app
 
 
+async def _prewarm(name: str, prewarm: Callable[[], Awaitable[int]]) -> None:
+    """Open connections of the pool, a failure only leaves the pool cold"""
+    started = time.perf_counter()
+    try:
+        connections = await prewarm()
+    except Exception:
+        logger.warning("failed to prewarm %s connections", name, exc_info=True)
+        return
+    finally:
+        STARTUP_DURATION.set(time.perf_counter() - started, name)
+    logger.info("prewarmed %s connections", name, extra={"connections": connections})
+
+
 def _cors(app: FastAPI):
     app.add_middleware(
         CORSMiddleware,
@@ -59,8 +148,29 @@ def _gzip(app: FastAPI):
     )
 
 
+def _load_shedding(app: FastAPI, config: Config):
+    if not config.LOAD_SHEDDING_ENABLED:
+        return
+    app.add_middleware(
+        LoadSheddingMiddleware,
+        limiter=ConcurrencyLimiter(
+            config.LOAD_SHEDDING_MAX_IN_FLIGHT,
+            config.LOAD_SHEDDING_CLASS_LIMITS,
+            config.LOAD_SHEDDING_QUEUE_SIZE,
+        ),
+        queue_timeout=config.LOAD_SHEDDING_QUEUE_TIMEOUT,
+        retry_after=config.LOAD_SHEDDING_RETRY_AFTER,
+    )
+
+
+def _metrics(app: FastAPI):
+    # added last, so the latency includes the other middlewares
+    app.add_middleware(MetricsMiddleware)
+
+
 def _routes(app: FastAPI):
     app.include_router(user_router, tags=["User"])
+    app.include_router(metrics_router, tags=["Metrics"])
 
 
 def _register_exception_handlers(app: FastAPI):
@@ -138,3 +248,13 @@ def _register_exception_handlers(app: FastAPI):
         else:
             detail = str(exc)
         return JSONResponse({"detail": detail}, status_code=400)
+
+    @app.exception_handler(HashingQueueFullError)
+    async def hashing_queue_full_exception_handler(
+        request: Request, exc: HashingQueueFullError
+    ):
+        return JSONResponse(
+            {"detail": "server is busy, please, try again later"},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
@@ -0,0 +1,205 @@
+import asyncio
+import bisect
+import itertools
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from services.metrics import (
+    LOAD_SHEDDING_IN_FLIGHT,
+    LOAD_SHEDDING_QUEUE_DEPTH,
+    LOAD_SHEDDING_REJECTED,
+    REQUEST_DURATION,
+)
+
+# label of requests which matched no route, keeps arbitrary paths out of metrics
+UNMATCHED_ROUTE = "unmatched"
+
+# route class of requests by method and path prefix, the first match wins,
+# requests of no class (metrics scrapes) are never limited
+ROUTE_CLASSES: Tuple[Tuple[str, str, Optional[str]], ...] = (
+    ("GET", "/metrics", None),
+    ("POST", "/create_user", "signup"),
+    ("POST", "/users", "read"),
+    ("GET", "/", "read"),
+    ("HEAD", "/", "read"),
+)
+DEFAULT_ROUTE_CLASS = "write"
+# waiting requests of lower values are admitted first: cheap cached reads
+# before updates, updates before signups which hash passwords
+ROUTE_CLASS_PRIORITIES = {"read": 0, "write": 1, "signup": 2}
+
+
+class MetricsMiddleware:
+    """Observes latency of HTTP requests by method, route template and status"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._route_paths: Dict[Callable, str] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                self._get_route_path(scope),
+                str(status),
+            )
+
+    def _get_route_path(self, scope: Scope) -> str:
+        # routing sets only the endpoint of the matched route in the scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if endpoint not in self._route_paths:
+            routes: List[BaseRoute] = scope["app"].routes
+            self._route_paths.update(
+                (route.endpoint, route.path)
+                for route in routes
+                if hasattr(route, "endpoint")
+            )
+        return self._route_paths.get(endpoint, UNMATCHED_ROUTE)
+
+
+def get_route_class(method: str, path: str) -> Optional[str]:
+    for route_method, prefix, route_class in ROUTE_CLASSES:
+        if method == route_method and path.startswith(prefix):
+            return route_class
+    return DEFAULT_ROUTE_CLASS
+
+
+class ConcurrencyLimiter:
+    """Limits requests processed at once, in total and by route class.
+
+    Requests over the limits wait in a queue of `queue_size` and are admitted
+    by priority of their class, then in order of arrival, as slots free up.
+    """
+
+    def __init__(self, limit: int, class_limits: Dict[str, int], queue_size: int):
+        self.limit = limit
+        self.class_limits = class_limits
+        self.queue_size = queue_size
+        self.in_flight: Counter = Counter()
+        # (priority, arrival, route class, future) sorted by priority and arrival
+        self._waiters: List[Tuple[int, int, str, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+
+    async def acquire(self, route_class: str, timeout: float) -> Optional[str]:
+        """Take a slot, return the reason of rejection if it isn't taken in time"""
+        # waiting requests can't be admitted, or they would have been already
+        if self._can_admit(route_class):
+            self._admit(route_class)
+            return None
+        if len(self._waiters) >= self.queue_size:
+            return "queue_full"
+        future = asyncio.get_running_loop().create_future()
+        waiter = (
+            ROUTE_CLASS_PRIORITIES.get(route_class, len(ROUTE_CLASS_PRIORITIES)),
+            next(self._arrivals),
+            route_class,
+            future,
+        )
+        bisect.insort(self._waiters, waiter)
+        self._set_queue_depth(route_class)
+        try:
+            # a slot given right at the deadline isn't lost to cancellation
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            return None
+        except asyncio.TimeoutError:
+            if future.done():
+                return None
+            return "timeout"
+        except asyncio.CancelledError:
+            if future.done():
+                self.release(route_class)
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+                self._waiters.remove(waiter)
+                self._set_queue_depth(route_class)
+
+    def release(self, route_class: str) -> None:
+        self.in_flight[route_class] -= 1
+        LOAD_SHEDDING_IN_FLIGHT.set(self.in_flight[route_class], route_class)
+        for waiter in list(self._waiters):
+            if sum(self.in_flight.values()) >= self.limit:
+                break
+            _, _, waiter_class, future = waiter
+            if self._can_admit(waiter_class):
+                self._waiters.remove(waiter)
+                self._set_queue_depth(waiter_class)
+                self._admit(waiter_class)
+                future.set_result(None)
+
+    def _can_admit(self, route_class: str) -> bool:
+        return sum(self.in_flight.values()) < self.limit and self.in_flight[
+            route_class
+        ] < self.class_limits.get(route_class, self.limit)
+
+    def _admit(self, route_class: str) -> None:
+        self.in_flight[route_class] += 1
+        LOAD_SHEDDING_IN_FLIGHT.set(self.in_flight[route_class], route_class)
+
+    def _set_queue_depth(self, route_class: str) -> None:
+        depth = sum(waiter[2] == route_class for waiter in self._waiters)
+        LOAD_SHEDDING_QUEUE_DEPTH.set(depth, route_class)
+
+
+class LoadSheddingMiddleware:
+    """Caps requests processed at once, rejects the ones which wait too long.
+
+    Rejected requests get a fast 503 with `Retry-After` instead of queueing
+    for the database pool with no bound.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: ConcurrencyLimiter,
+        queue_timeout: float,
+        retry_after: int,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route_class = get_route_class(scope["method"], scope["path"])
+        if route_class is None:
+            return await self.app(scope, receive, send)
+
+        rejection = await self.limiter.acquire(route_class, self.queue_timeout)
+        if rejection:
+            LOAD_SHEDDING_REJECTED.inc(route_class, rejection)
+            response = JSONResponse(
+                {"detail": "server is busy, please, try again later"},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(route_class)
@@ -0,0 +1,17 @@
+"""Create the database schema, run once per deploy before starting the workers"""
+import asyncio
+
+from sqlmodel import SQLModel
+
+import models.user  # noqa: tables are registered in the metadata on import
+from clients.database import engine
+
+
+async def migrate() -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -1 +1,2 @@
+from .metrics import metrics_router
 from .user import user_router
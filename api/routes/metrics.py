@@ -0,0 +1,30 @@
+from typing import Dict, List, Union
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from clients.database import get_pool_stats
+from services.metrics import registry
+from services.user_filter import user_filter
+
+metrics_router = APIRouter(prefix="/metrics")
+
+# content type of Prometheus text exposition format, charset is added by the response
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+@metrics_router.get("", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """Metrics of the worker serving the request, in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@metrics_router.get("/db_pool")
+async def get_db_pool_metrics() -> Dict[str, Union[int, float, List]]:
+    return get_pool_stats()
+
+
+@metrics_router.get("/user_filter")
+async def get_user_filter_metrics() -> Dict[str, Union[bool, int, float]]:
+    """Memory and false positive rate of the filters of existing users"""
+    return user_filter.get_stats()
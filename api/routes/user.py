@@ -1,10 +1,20 @@
-from fastapi import APIRouter
-from fastapi.params import Body, Depends, Path
+from typing import List
+
+from fastapi import APIRouter, Response
+from fastapi.params import Body, Depends, Path, Query
 from fastapi.security import HTTPBearer
 from fastapi_jwt_auth import AuthJWT
 from pydantic.types import PositiveInt
 
-from models.user import User, AuthUser, UpdateUser, CreateUser
+from models.user import (
+    USERS_BATCH_SIZE,
+    AuthUser,
+    BatchUser,
+    CreateUser,
+    UpdateUser,
+    User,
+    UsersBatch,
+)
 from services.user import UserService
 from utils.jwt import check_jwt_auth_and_return_user_id, create_access_token
 
@@ -14,9 +24,32 @@ user_router = APIRouter()
 @user_router.get("/get_user/{user_id}", response_model=User)
 async def get_user(
     user_id: PositiveInt = Path(...),
-) -> User:
-    user = await UserService.get_user(user_id)
-    return user
+) -> Response:
+    # user is returned rendered by the cache, skipping response model validation
+    user = await UserService.get_user_json(user_id)
+    return Response(user, media_type="application/json")
+
+
+@user_router.get("/users", response_model=List[BatchUser])
+async def get_users(
+    ids: List[PositiveInt] = Query(..., min_items=1, max_items=USERS_BATCH_SIZE),
+) -> List[BatchUser]:
+    return await _get_users_batch(ids)
+
+
+@user_router.post("/users", response_model=List[BatchUser])
+async def get_users_by_body(
+    batch: UsersBatch = Body(...),
+) -> List[BatchUser]:
+    return await _get_users_batch(batch.ids)
+
+
+async def _get_users_batch(ids: List[PositiveInt]) -> List[BatchUser]:
+    users = await UserService.get_users(ids)
+    return [
+        BatchUser(id=user_id, found=user is not None, user=user)
+        for user_id, user in zip(ids, users)
+    ]
 
 
 @user_router.post("/create_user/", response_model=CreateUser)
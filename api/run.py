@@ -1,16 +1,87 @@
+from typing import Optional
+
 import uvicorn
+from fastapi import FastAPI
+from uvicorn.workers import UvicornWorker
 
 from api.init_api import init_api
-from config import config
+from config import Config, config
+from utils.logging import setup_logging
+
+HOST = "0.0.0.0"
+PORT = 8000
 
+setup_logging(config)
 app = init_api(config)
 
-if __name__ == "__main__":
+
+class GunicornWorker(UvicornWorker):
+    """Uvicorn worker of gunicorn, gunicorn takes it by its dotted path"""
+
+    # uvicorn settings gunicorn has no options for
+    CONFIG_KWARGS = {
+        "loop": config.SERVER_LOOP,
+        "http": config.SERVER_HTTP,
+        "access_log": config.ACCESS_LOG,
+    }
+
+
+def run_uvicorn(config: Config) -> None:
+    """Serve by uvicorn, which starts `WORKERS` processes when above one"""
     uvicorn.run(
         "api.run:app",
-        host="0.0.0.0",
-        port=8000,
+        host=HOST,
+        port=PORT,
         workers=config.WORKERS,
+        loop=config.SERVER_LOOP,
+        http=config.SERVER_HTTP,
+        backlog=config.SERVER_BACKLOG,
+        timeout_keep_alive=config.SERVER_KEEP_ALIVE,
         debug=config.IS_DEBUG,
-        access_log=config.IS_DEBUG,
+        access_log=config.ACCESS_LOG,
+        # logging is set up by the application, see `setup_logging`
+        log_config=None,
     )
+
+
+def run_gunicorn(
+    config: Config, bind: str = f"{HOST}:{PORT}", app_: Optional[FastAPI] = None
+) -> None:
+    """Serve by gunicorn, pre-forking `WORKERS` uvicorn workers.
+
+    With `SERVER_PRELOAD` workers get the app built before forking, otherwise
+    every worker builds its own. Workers which served `SERVER_MAX_REQUESTS`
+    requests are replaced with new ones.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self) -> None:
+            options = {
+                "bind": bind,
+                "workers": config.WORKERS,
+                "worker_class": f"{__name__}.GunicornWorker",
+                "backlog": config.SERVER_BACKLOG,
+                "keepalive": config.SERVER_KEEP_ALIVE,
+                "max_requests": config.SERVER_MAX_REQUESTS,
+                "max_requests_jitter": config.SERVER_MAX_REQUESTS_JITTER,
+                "preload_app": config.SERVER_PRELOAD,
+                # the log writer thread of the master doesn't survive fork
+                "post_fork": lambda server, worker: setup_logging(config),
+            }
+            for name, value in options.items():
+                self.cfg.set(name, value)
+
+        def load(self) -> FastAPI:
+            if config.SERVER_PRELOAD:
+                return app_ or app
+            return init_api(config)
+
+    Application().run()
+
+
+if __name__ == "__main__":
+    if config.SERVER_RUNTIME == "gunicorn":
+        run_gunicorn(config)
+    else:
+        run_uvicorn(config)
@@ -0,0 +1,36 @@
+"""Load users into the cache, e.g. after a redis restart or flush"""
+import argparse
+import asyncio
+from typing import List, Optional
+
+from clients.database import engine
+from config import config
+from services.warmup import WarmupService
+
+
+async def warm_up(
+    source: str, limit: int, rate: int, user_ids: Optional[List[int]]
+) -> int:
+    try:
+        if user_ids:
+            return await WarmupService.warm_up_users(user_ids, rate)
+        return await WarmupService.warm_up(source, limit, rate)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--source", choices=["hot", "recent"], default=config.WARMUP_SOURCE
+    )
+    parser.add_argument("--limit", type=int, default=config.WARMUP_USERS)
+    parser.add_argument(
+        "--rate", type=int, default=config.WARMUP_RATE, help="users per second"
+    )
+    parser.add_argument(
+        "--ids", type=int, nargs="+", help="warm up these users instead of --source"
+    )
+    args = parser.parse_args()
+    found = asyncio.run(warm_up(args.source, args.limit, args.rate, args.ids))
+    print(f"{found} users are in the cache")
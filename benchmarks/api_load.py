@@ -0,0 +1,299 @@
+"""Throughput and latency of the API under a mix of concurrent requests.
+
+The app built by `init_api` is served by one uvicorn worker in a child
+process, against SQLite (or `--database-url`) and an in-process redis
+stand-in, so nothing but the project itself is needed. Clients run in this
+process, compare reports made on the same machine only.
+
+Run from the project root:
+    python -m benchmarks.api_load --duration 10 --concurrency 50 \\
+        --mix get_user=90,update_user=8,create_user=2 --output report.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import random
+import socket
+import subprocess
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import httpx
+
+PROJECT_ROOT_PATH = Path(__file__).parent.parent
+DEFAULT_DATABASE_URL = f"sqlite:///{PROJECT_ROOT_PATH}/bench_db.sqlite"
+DEFAULT_MIX = "get_user=90,update_user=8,create_user=2"
+# hash of "password", seeded users are created without paying for bcrypt
+SEED_PASSWORD = "$2b$12$O3MYXaKY5uw6TJ9PSQDI5uCMh3bj8ZQjpAUtkhinrRDiOQhSkuUEi"
+OPERATIONS = ("get_user", "update_user", "create_user")
+# numbers of created users, unique across warm-up and measured runs
+created_users = itertools.count(1)
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        operation, weight = item.split("=")
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {operation}")
+        weights[operation] = int(weight)
+    return weights
+
+
+def percentile(latencies: List[float], share: float) -> float:
+    """Nearest-rank percentile of sorted latencies, in milliseconds"""
+    if not latencies:
+        return 0.0
+    rank = max(0, round(share * len(latencies) + 0.5) - 1)
+    return round(latencies[min(rank, len(latencies) - 1)] * 1000, 3)
+
+
+def summarize(results: List[Tuple[float, bool]], elapsed: float) -> Dict:
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(not ok for _, ok in results)
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "throughput_rps": round(len(results) / elapsed, 1),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def check_errors(sections: Dict[str, Dict]) -> None:
+    """Fail the run if any requests failed, their latencies skew the report"""
+    failed = {
+        name: section["errors"]
+        for name, section in sections.items()
+        if section["errors"]
+    }
+    if failed:
+        raise SystemExit(f"requests failed, the report is not valid: {failed}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT_PATH,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Server(multiprocessing.Process):
+    """Serves the app in a child process, seeding the database first"""
+
+    def __init__(
+        self,
+        database_url: str,
+        port: int,
+        users: int,
+        loop: str = "auto",
+        http: str = "auto",
+    ):
+        # not daemonic, daemonic processes can't start the hashing pool
+        super().__init__()
+        self.database_url = database_url
+        self.port = port
+        self.users = users
+        self.loop = loop
+        self.http = http
+        self.ready = multiprocessing.Event()
+
+    def run(self) -> None:
+        import uvicorn
+
+        # the event loop policy of `loop`, set up before the loop is created
+        uvicorn.Config(None, loop=self.loop).setup_event_loop()
+        asyncio.run(self._serve())
+
+    async def _prepare(self) -> None:
+        """Point the app at the benchmark database and the redis stand-in"""
+        from sqlmodel import SQLModel
+
+        from benchmarks.memory_redis import MemoryRedis
+        from clients import database
+        from config import config
+        from models.user import User
+        from services import caching
+
+        database.engine = database.make_engine(self.database_url)
+        caching.redis_client = MemoryRedis()
+        # the stand-in has no connections to prewarm
+        config.REDIS_PREWARM_CONNECTIONS = 0
+
+        async with database.engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.drop_all)
+            await connection.run_sync(SQLModel.metadata.create_all)
+        async with database.get_session() as session:
+            session.add_all(
+                User(login=f"user_{i}", password=SEED_PASSWORD)
+                for i in range(1, self.users + 1)
+            )
+            await session.commit()
+
+    async def _serve(self) -> None:
+        import uvicorn
+
+        from api.init_api import init_api
+        from config import config
+
+        await self._prepare()
+        server = uvicorn.Server(
+            uvicorn.Config(
+                init_api(config),
+                host="127.0.0.1",
+                port=self.port,
+                http=self.http,
+                log_level="warning",
+                access_log=False,
+            )
+        )
+        serving = asyncio.create_task(server.serve())
+        while not server.started and not serving.done():
+            await asyncio.sleep(0.01)
+        self.ready.set()
+        await serving
+
+    def stop(self) -> None:
+        # uvicorn shuts down gracefully on SIGTERM
+        self.terminate()
+        self.join()
+
+
+async def drive(
+    base_url: str,
+    users: int,
+    mix: Dict[str, int],
+    concurrency: int,
+    duration: float,
+    seed: int,
+) -> Dict:
+    from fastapi_jwt_auth import AuthJWT
+
+    from utils.jwt import create_access_token
+
+    rng = random.Random(seed)
+    operations, weights = zip(*mix.items())
+    tokens = {
+        user_id: create_access_token(AuthJWT(), f"user_{user_id}", user_id)
+        for user_id in range(1, users + 1)
+    }
+    results: Dict[str, List[Tuple[float, bool]]] = defaultdict(list)
+
+    async def request(client: httpx.AsyncClient, operation: str) -> httpx.Response:
+        user_id = rng.randint(1, users)
+        if operation == "get_user":
+            return await client.get(f"/get_user/{user_id}")
+        if operation == "update_user":
+            return await client.patch(
+                "/update_user/",
+                json={"name": f"name_{rng.random()}"},
+                headers={"Authorization": f"Bearer {tokens[user_id]}"},
+            )
+        return await client.post(
+            "/create_user/",
+            json={"login": f"new_user_{next(created_users)}", "password": "pass"},
+        )
+
+    async def client_loop(client: httpx.AsyncClient, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await request(client, operation)
+                ok = response.is_success
+            except httpx.HTTPError:
+                ok = False
+            results[operation].append((time.perf_counter() - started, ok))
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=30
+    ) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(
+            *(client_loop(client, deadline) for _ in range(concurrency))
+        )
+        elapsed = time.perf_counter() - started
+
+    all_results = [result for items in results.values() for result in items]
+    return {
+        "total": summarize(all_results, elapsed),
+        "operations": {
+            operation: summarize(items, elapsed) for operation, items in results.items()
+        },
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    server = Server(args.database_url, free_port(), args.users)
+    server.start()
+    try:
+        if not server.ready.wait(timeout=60):
+            raise RuntimeError("server didn't start in 60 seconds")
+
+        base_url = f"http://127.0.0.1:{server.port}"
+        asyncio.run(
+            drive(
+                base_url, args.users, args.mix, args.concurrency, args.warmup, args.seed
+            )
+        )
+        report = asyncio.run(
+            drive(
+                base_url,
+                args.users,
+                args.mix,
+                args.concurrency,
+                args.duration,
+                args.seed,
+            )
+        )
+    finally:
+        server.stop()
+
+    report = {
+        "revision": git_revision(),
+        "settings": {
+            "database_url": args.database_url,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": args.mix,
+        },
+        **report,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+    check_errors(report["operations"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report to this file")
+    main(parser.parse_args())
@@ -0,0 +1,39 @@
+"""Encode/decode cost and payload size of cache codecs for `User` records.
+
+Run from the project root:
+    python -m benchmarks.cache_codecs --number 100000
+"""
+import argparse
+import json
+import timeit
+
+from models.user import User
+from services.caching import CODECS, decode_value
+
+
+def main(number: int) -> None:
+    value = User(
+        id=123456,
+        login="test_user",
+        name="Test User",
+        password="$2b$12$O3MYXaKY5uw6TJ9PSQDI5uCMh3bj8ZQjpAUtkhinrRDiOQhSkuUEi",
+    ).dict()
+
+    report = {}
+    for name, codec_class in CODECS.items():
+        codec = codec_class()
+        encoded = codec.encode(value)
+        encode_time = timeit.timeit(lambda: codec.encode(value), number=number)
+        decode_time = timeit.timeit(lambda: decode_value(encoded), number=number)
+        report[name] = {
+            "encode_us": round(encode_time / number * 1e6, 3),
+            "decode_us": round(decode_time / number * 1e6, 3),
+            "payload_bytes": len(encoded),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000)
+    main(parser.parse_args().number)
@@ -0,0 +1,94 @@
+"""Concurrent `get_user` database throughput: blocking sessions vs asyncio sessions.
+
+The "sync" mode reproduces the old behaviour - a synchronous SQLModel session
+queried from inside a coroutine, which blocks the event loop for every round
+trip. The "async" mode goes through `UserDBService.get_user`.
+
+Run from the project root:
+    python -m benchmarks.get_user_concurrency --requests 2000 --concurrency 50
+
+Point `--database-url` at Postgres to see the effect of network latency
+(the sync baseline needs `psycopg2` installed for that).
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from clients import database
+from models.services.user import UserDBService
+from models.user import User
+
+PROJECT_ROOT_PATH = Path(__file__).parent.parent
+DEFAULT_DATABASE_URL = f"sqlite:///{PROJECT_ROOT_PATH}/bench_db.sqlite"
+
+
+async def _measure_loop_lag(stop: asyncio.Event, lags: list) -> None:
+    """Record how late a 1ms ticker wakes up while the load is running"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def _run(
+    get_user: Callable[[int], Awaitable], users: int, requests: int, concurrency: int
+) -> Dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            await get_user(i % users + 1)
+
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(_measure_loop_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "max_loop_lag_ms": round(max(lags, default=0) * 1000, 3),
+    }
+
+
+async def main(database_url: str, users: int, requests: int, concurrency: int):
+    sync_engine = create_engine(database_url)
+    SQLModel.metadata.drop_all(sync_engine)
+    SQLModel.metadata.create_all(sync_engine)
+    with Session(sync_engine) as session:
+        session.add_all(
+            User(login=f"user_{i}", password="password") for i in range(users)
+        )
+        session.commit()
+
+    async def sync_get_user(user_id: int):
+        with Session(sync_engine) as session:
+            return session.exec(select(User).where(User.id == user_id)).first()
+
+    # route UserDBService through an engine for the benchmark database
+    database.engine = create_async_engine(database.get_async_database_url(database_url))
+
+    report = {
+        "sync": await _run(sync_get_user, users, requests, concurrency),
+        "async": await _run(UserDBService.get_user, users, requests, concurrency),
+    }
+    await database.engine.dispose()
+    sync_engine.dispose()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.database_url, args.users, args.requests, args.concurrency))
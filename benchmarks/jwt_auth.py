@@ -0,0 +1,59 @@
+"""Cost of the JWT auth dependency for cold (unverified) and warm (cached) tokens.
+
+Run from the project root:
+    python -m benchmarks.jwt_auth --number 20000
+"""
+import argparse
+import json
+import timeit
+
+from fastapi_jwt_auth import AuthJWT
+
+from utils.jwt import (
+    check_jwt_auth_and_return_user_id,
+    create_access_token,
+    verified_tokens,
+)
+
+
+def make_authorize(token: str) -> AuthJWT:
+    # as built by the `Depends()` of the endpoint from the Authorization header
+    authorize = AuthJWT()
+    authorize._token = token
+    return authorize
+
+
+def main(number: int) -> None:
+    tokens = [
+        create_access_token(AuthJWT(), f"user_{user_id}", user_id)
+        for user_id in range(1, number + 1)
+    ]
+
+    # every token is verified for the first time
+    verified_tokens.clear()
+    cold_tokens = iter(tokens)
+    cold_time = timeit.timeit(
+        lambda: check_jwt_auth_and_return_user_id(make_authorize(next(cold_tokens))),
+        number=number,
+    )
+
+    # the same token again and again
+    token = tokens[0]
+    check_jwt_auth_and_return_user_id(make_authorize(token))
+    warm_time = timeit.timeit(
+        lambda: check_jwt_auth_and_return_user_id(make_authorize(token)),
+        number=number,
+    )
+
+    report = {
+        "cold_us": round(cold_time / number * 1e6, 3),
+        "warm_us": round(warm_time / number * 1e6, 3),
+        "cached_tokens": len(verified_tokens),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    main(parser.parse_args().number)
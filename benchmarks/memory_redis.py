@@ -0,0 +1,146 @@
+"""In-process stand-in for the redis client, covering the commands the app uses.
+
+Values live in a dict of the process, so benchmarks measure the application
+rather than a redis server. Not safe to share between event loops.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+class MemoryRedis:
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        # sorted sets never expire
+        self._sorted_sets: Dict[str, Dict[bytes, float]] = {}
+        self._subscribers: Set["MemoryPubSub"] = set()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [await self.get(key) for key in keys]
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ex: Optional[int] = None,
+        px: Optional[int] = None,
+        nx: bool = False,
+    ) -> Optional[bool]:
+        if nx and await self.get(key) is not None:
+            return None
+        ttl = ex if ex is not None else px / 1000 if px is not None else None
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        if not isinstance(value, bytes):
+            value = str(value).encode()
+        self._data[key] = (value, expires_at)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        item = self._data.get(key)
+        if item is not None:
+            self._data[key] = (item[0], time.monotonic() + seconds)
+        return item is not None
+
+    async def zincrby(self, key: str, amount: float, member: Any) -> float:
+        members = self._sorted_sets.setdefault(key, {})
+        member = str(member).encode()
+        members[member] = members.get(member, 0) + amount
+        return members[member]
+
+    async def zrevrange(self, key: str, start: int, end: int) -> List[bytes]:
+        members = self._sorted_members(key)[::-1]
+        return members[start : end + 1 if end != -1 else None]
+
+    async def zremrangebyrank(self, key: str, start: int, end: int) -> int:
+        members = self._sorted_members(key)
+        removed = members[start : end + 1 if end != -1 else None]
+        for member in removed:
+            del self._sorted_sets[key][member]
+        return len(removed)
+
+    def _sorted_members(self, key: str) -> List[bytes]:
+        members = self._sorted_sets.get(key, {})
+        return sorted(members, key=lambda member: (members[member], member))
+
+    async def publish(self, channel: str, message: str) -> int:
+        receivers = [sub for sub in self._subscribers if channel in sub.channels]
+        for subscriber in receivers:
+            subscriber.messages.put_nowait(
+                {"type": "message", "channel": channel, "data": message.encode()}
+            )
+        return len(receivers)
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> int:
+        # the only script of the app releases a lock owned by the token
+        key, token = keys_and_args
+        if await self.get(key) == str(token).encode():
+            return await self.delete(key)
+        return 0
+
+    def pipeline(self, transaction: bool = True) -> "MemoryPipeline":
+        return MemoryPipeline(self)
+
+    def pubsub(self) -> "MemoryPubSub":
+        return MemoryPubSub(self)
+
+
+class MemoryPipeline:
+    def __init__(self, redis: MemoryRedis):
+        self._redis = redis
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, command: str):
+        def queue_command(*args, **kwargs) -> "MemoryPipeline":
+            self._commands.append((command, args, kwargs))
+            return self
+
+        return queue_command
+
+    async def execute(self) -> List[Any]:
+        commands, self._commands = self._commands, []
+        return [
+            await getattr(self._redis, command)(*args, **kwargs)
+            for command, args, kwargs in commands
+        ]
+
+    async def __aenter__(self) -> "MemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._commands = []
+
+
+class MemoryPubSub:
+    def __init__(self, redis: MemoryRedis):
+        self._redis = redis
+        self.channels: Set[str] = set()
+        self.messages: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels: str) -> None:
+        self.channels.update(channels)
+        self._redis._subscribers.add(self)
+
+    async def get_message(
+        self, ignore_subscribe_messages: bool = False, timeout: float = 0.0
+    ) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def reset(self) -> None:
+        self.channels.clear()
+        self._redis._subscribers.discard(self)
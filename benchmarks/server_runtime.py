@@ -0,0 +1,130 @@
+"""Latency and throughput of `/get_user` served by every server runtime.
+
+Modes are served one after another by a child process, against SQLite and an
+in-process redis stand-in as in `benchmarks.api_load`: plain asyncio with the
+h11 parser, uvloop with httptools, and gunicorn pre-forking uvloop workers
+from a preloaded app. With `--workers` above one, gunicorn workers keep
+their own redis stand-ins, compare it to the single worker modes with care.
+
+Run from the project root:
+    python -m benchmarks.server_runtime --duration 10 --concurrency 50 \\
+        --workers 2 --output report.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Dict
+
+import httpx
+
+from benchmarks.api_load import (
+    DEFAULT_DATABASE_URL,
+    Server,
+    check_errors,
+    drive,
+    free_port,
+    git_revision,
+)
+
+MODES = ("asyncio_h11", "uvloop_httptools", "gunicorn")
+
+
+class GunicornServer(Server):
+    """Serves the app by gunicorn workers forked from this child process"""
+
+    def __init__(self, database_url: str, port: int, users: int, workers: int):
+        super().__init__(database_url, port, users, loop="uvloop", http="httptools")
+        self.workers = workers
+
+    def run(self) -> None:
+        # clients created on import need a current loop, the loops of the
+        # parent process are closed
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        from api.init_api import init_api
+        from api.run import run_gunicorn
+        from clients import database
+        from config import config
+
+        asyncio.run(self._prepare())
+        # connections of the seeding loop can't be used by the workers
+        asyncio.run(database.engine.dispose())
+        config.WORKERS = self.workers
+        config.SERVER_LOOP = self.loop
+        config.SERVER_HTTP = self.http
+        config.SERVER_PRELOAD = True
+        run_gunicorn(config, f"127.0.0.1:{self.port}", init_api(config))
+
+
+def make_server(mode: str, args: argparse.Namespace) -> Server:
+    port = free_port()
+    if mode == "gunicorn":
+        return GunicornServer(args.database_url, port, args.users, args.workers)
+    loop, http = mode.split("_")
+    return Server(args.database_url, port, args.users, loop, http)
+
+
+async def wait_until_serving(base_url: str, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            try:
+                if (await client.get("/metrics")).is_success:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"server didn't start in {timeout} seconds")
+            await asyncio.sleep(0.1)
+
+
+def run_mode(mode: str, args: argparse.Namespace) -> Dict:
+    server = make_server(mode, args)
+    server.start()
+    base_url = f"http://127.0.0.1:{server.port}"
+    try:
+        asyncio.run(wait_until_serving(base_url, 60))
+        mix = {"get_user": 1}
+        asyncio.run(
+            drive(base_url, args.users, mix, args.concurrency, args.warmup, args.seed)
+        )
+        report = asyncio.run(
+            drive(base_url, args.users, mix, args.concurrency, args.duration, args.seed)
+        )
+    finally:
+        server.stop()
+    return report["total"]
+
+
+def main(args: argparse.Namespace) -> None:
+    report = {
+        "revision": git_revision(),
+        "settings": {
+            "database_url": args.database_url,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "workers": args.workers,
+        },
+        "modes": {mode: run_mode(mode, args) for mode in args.modes},
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+    check_errors(report["modes"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report to this file")
+    main(parser.parse_args())
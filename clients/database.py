@@ -1,22 +1,275 @@
-from contextlib import contextmanager
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, Hashable, List, Optional, Union
 
-from sqlmodel import Session, create_engine
+from sqlalchemy.exc import DBAPIError, TimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import models  # noqa
 from config import config
 
-connect_args = {"connect_timeout": 10}
-engine = create_engine(
-    config.DATABASE_URL, pool_size=3, max_overflow=0, connect_args=connect_args
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Switch plain database url to the asyncio driver of the same database"""
+    scheme, separator, rest = str(database_url).partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{separator}{rest}"
+
+
+class PoolStats:
+    """Counters of connection checkouts of one pool"""
+
+    # upper bounds of wait time histogram buckets, in seconds
+    WAIT_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_sum = 0.0
+        self.wait_time_counts = [0] * (len(self.WAIT_TIME_BUCKETS) + 1)
+        # new connections opened by checkouts, apart from the wait
+        self.connects = 0
+        self.connect_time_sum = 0.0
+
+    def observe_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_time_sum += seconds
+        self.wait_time_counts[bisect.bisect_left(self.WAIT_TIME_BUCKETS, seconds)] += 1
+
+    def observe_connect(self, seconds: float) -> None:
+        self.connects += 1
+        self.connect_time_sum += seconds
+
+    def snapshot(self) -> Dict[str, Union[int, float, List]]:
+        cumulative, buckets = 0, []
+        for bound, count in zip(
+            (*self.WAIT_TIME_BUCKETS, "+Inf"), self.wait_time_counts
+        ):
+            cumulative += count
+            buckets.append([bound, cumulative])
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_time_sum": self.wait_time_sum,
+            "wait_time_buckets": buckets,
+            "connects": self.connects,
+            "connect_time_sum": self.connect_time_sum,
+        }
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Connection pool recording how long checkouts wait and how often they fail.
+
+    Opening a new connection during a checkout isn't waiting for the pool, its
+    time is recorded apart.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        # wall clock, as start times of connection records
+        started = time.time()
+        try:
+            connection = super().connect()
+        except TimeoutError:
+            self.stats.timeouts += 1
+            self.stats.observe_wait(time.time() - started)
+            raise
+        finished = time.time()
+        connected_at = connection._connection_record.starttime
+        if connected_at >= started:
+            # the connection was opened by this checkout, after the wait
+            self.stats.observe_wait(connected_at - started)
+            self.stats.observe_connect(finished - connected_at)
+        else:
+            self.stats.observe_wait(finished - started)
+        return connection
+
+    def recreate(self):
+        # keep counters when the engine is disposed
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def make_engine(database_url: str) -> AsyncEngine:
+    """Create engine of the database with pool settings from config"""
+    pool_args = {
+        "poolclass": InstrumentedPool,
+        "pool_size": config.DATABASE_POOL_SIZE,
+        "max_overflow": config.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": config.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": config.DATABASE_POOL_RECYCLE,
+    }
+    if database_url.startswith("sqlite"):
+        # sqlite (used in tests) works without a connection pool
+        pool_args = {}
+    return create_async_engine(
+        get_async_database_url(database_url),
+        connect_args={"timeout": config.DATABASE_CONNECT_TIMEOUT},
+        pool_pre_ping=config.DATABASE_POOL_PRE_PING,
+        **pool_args,
+    )
+
+
+def get_pool_stats(engine_: AsyncEngine = None) -> Dict[str, Union[int, float, List]]:
+    """Current state of the connection pool of the engine"""
+    pool = (engine_ or engine).sync_engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    stats = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
+    if isinstance(pool, InstrumentedPool):
+        stats.update(pool.stats.snapshot())
+    return stats
+
+
+async def prewarm_database_pool(connections: int, engine_: AsyncEngine = None) -> int:
+    """Open connections of the pool ahead of requests, return how many were opened"""
+    engine_ = engine_ or engine
+    pool = engine_.sync_engine.pool
+    if not isinstance(pool, QueuePool):
+        return 0
+    connections = min(connections, pool.size())
+    # hold all of them at once, otherwise the same connection is reused
+    async with AsyncExitStack() as stack:
+        await asyncio.gather(
+            *(stack.enter_async_context(engine_.connect()) for _ in range(connections))
+        )
+    return connections
+
+
+class ReplicaSet:
+    """Engines of read-only replicas, one is chosen for every read session.
+
+    Busy replicas are judged by sessions open in this worker. A replica which
+    failed to connect is skipped for `retry_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        engines: List[AsyncEngine],
+        selection: str = "round_robin",
+        retry_interval: float = 30,
+    ):
+        self.engines = engines
+        self.selection = selection
+        self.retry_interval = retry_interval
+        self.sessions = {engine_: 0 for engine_ in engines}
+        self._failed_until = {engine_: 0.0 for engine_ in engines}
+        self._turns = itertools.count()
+
+    def acquire(self) -> Optional[AsyncEngine]:
+        """Choose a replica for a session, `None` if none is available"""
+        now = time.monotonic()
+        available = [
+            engine_ for engine_ in self.engines if self._failed_until[engine_] <= now
+        ]
+        if not available:
+            return None
+        if self.selection == "least_busy":
+            replica = min(available, key=self.sessions.__getitem__)
+        else:
+            replica = available[next(self._turns) % len(available)]
+        self.sessions[replica] += 1
+        return replica
+
+    def release(self, replica: AsyncEngine) -> None:
+        self.sessions[replica] -= 1
+
+    def mark_failed(self, replica: AsyncEngine) -> None:
+        self._failed_until[replica] = time.monotonic() + self.retry_interval
+
+    async def dispose(self) -> None:
+        await asyncio.gather(*(engine_.dispose() for engine_ in self.engines))
+
+
+class RecentWrites:
+    """Keys written by this worker in the last `ttl` seconds.
+
+    Reads of them go to the primary, replicas may not have the write yet.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # ordered by expiration, writes are moved to the end
+        self._expires_at: Dict[Hashable, float] = {}
+
+    def add(self, key: Hashable) -> None:
+        now = time.monotonic()
+        self._expires_at.pop(key, None)
+        self._expires_at[key] = now + self.ttl
+        for expired_key, expires_at in list(self._expires_at.items()):
+            if expires_at > now:
+                break
+            del self._expires_at[expired_key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._expires_at.get(key, 0) > time.monotonic()
+
+    def clear(self) -> None:
+        self._expires_at.clear()
+
+
+engine: AsyncEngine = make_engine(config.DATABASE_URL)
+replicas = ReplicaSet(
+    [make_engine(str(url)) for url in config.DATABASE_REPLICA_URLS],
+    config.DATABASE_REPLICA_SELECTION,
+    config.DATABASE_REPLICA_RETRY_INTERVAL,
 )
 
 
-@contextmanager
-def get_session(engine_=None) -> Session:
+@asynccontextmanager
+async def get_session(engine_: AsyncEngine = None) -> AsyncSession:
     if not engine_:
         engine_ = engine
-    session = Session(engine_)
+    session = AsyncSession(engine_, expire_on_commit=False)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+@asynccontextmanager
+async def get_read_session(primary: bool = False) -> AsyncSession:
+    """Session for read-only queries, of a replica unless `primary` is set.
+
+    A replica which fails to connect is skipped and the session falls over to
+    the primary, as it does when no replica is available.
+    """
+    replica = None if primary else replicas.acquire()
+    session = AsyncSession(replica or engine, expire_on_commit=False)
     try:
+        if replica:
+            try:
+                await session.connection()
+            # asyncpg raises asyncio.TimeoutError on DATABASE_CONNECT_TIMEOUT
+            except (DBAPIError, OSError, asyncio.TimeoutError):
+                logger.warning("database replica is unavailable", exc_info=True)
+                replicas.mark_failed(replica)
+                await session.close()
+                session = AsyncSession(engine, expire_on_commit=False)
         yield session
     finally:
-        session.close()
+        if replica:
+            replicas.release(replica)
+        await session.close()
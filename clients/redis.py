@@ -1,5 +1,236 @@
-from aioredis import Redis
+import asyncio
+import bisect
+import hashlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from aioredis import BlockingConnectionPool, Redis
+from aioredis.exceptions import RedisError
 
 from config import config
 
-redis_client = Redis.from_url(config.REDIS_URL, encoding="utf-8", decode_responses=True)
+
+def make_redis_client(redis_url: str) -> Redis:
+    """Create client of the redis with pool settings from config"""
+    # values are encoded by the codecs of CachingService, so keep them as bytes
+    connection_pool = BlockingConnectionPool.from_url(
+        redis_url,
+        max_connections=config.REDIS_MAX_CONNECTIONS,
+        timeout=config.REDIS_POOL_TIMEOUT,
+        socket_connect_timeout=config.REDIS_CONNECT_TIMEOUT,
+        socket_timeout=config.REDIS_READ_TIMEOUT,
+        health_check_interval=config.REDIS_HEALTH_CHECK_INTERVAL,
+    )
+    return Redis(connection_pool=connection_pool)
+
+
+def ring_hash(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """Consistent hashing of keys to nodes.
+
+    Every node owns `virtual_nodes` points of the ring, a key belongs to the
+    node of the first point after the hash of the key. Adding or removing one
+    of n nodes moves about 1/n of the keys, the rest stay where they were.
+    """
+
+    def __init__(self, nodes: List[str], virtual_nodes: int = 160):
+        points = sorted(
+            (ring_hash(f"{node}#{number}"), node)
+            for node in nodes
+            for number in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get_node(self, key: str) -> str:
+        position = bisect.bisect(self._hashes, ring_hash(key))
+        return self._nodes[position % len(self._nodes)]
+
+
+class ShardsUnavailableError(RedisError):
+    """Some nodes failed a multi-key command, values of the others are kept"""
+
+    def __init__(self, values: List[Any], failed: List[int], error: Exception):
+        super().__init__(f"{len(failed)} keys are on unavailable nodes: {error}")
+        self.values = values
+        # positions of the keys of the failed nodes
+        self.failed = failed
+
+
+class ShardedRedis:
+    """Redis client spreading keys across nodes by consistent hashing.
+
+    Covers the commands of CachingService. Multi-key commands and pipelines
+    are split by node and sent to all the nodes concurrently. Pub/sub goes to
+    the first node. With one node commands go to it as they are.
+    """
+
+    def __init__(self, nodes: Dict[str, Redis], virtual_nodes: int = 160):
+        self.nodes = nodes
+        self.ring = HashRing(list(nodes), virtual_nodes)
+        self.pubsub_node = next(iter(nodes.values()))
+
+    def get_node(self, key: str) -> Redis:
+        if len(self.nodes) == 1:
+            return self.pubsub_node
+        return self.nodes[self.ring.get_node(key)]
+
+    def group_keys(self, keys: List[str]) -> Dict[Redis, List[int]]:
+        """Positions of the keys by their nodes"""
+        positions = defaultdict(list)
+        for position, key in enumerate(keys):
+            positions[self.get_node(key)].append(position)
+        return positions
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.get_node(key).get(key)
+
+    async def set(self, key: str, value: Any, **kwargs) -> Optional[bool]:
+        return await self.get_node(key).set(key, value, **kwargs)
+
+    async def zrevrange(self, key: str, start: int, end: int) -> List[bytes]:
+        return await self.get_node(key).zrevrange(key, start, end)
+
+    async def eval(self, script: str, numkeys: int, key: str, *args: Any) -> Any:
+        # scripts of the app touch one key, which decides the node
+        return await self.get_node(key).eval(script, numkeys, key, *args)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        """Values of the keys, a failure of some of the nodes raises
+        `ShardsUnavailableError` with the values of the others"""
+        groups = self.group_keys(keys)
+        if len(groups) == 1:
+            node, _ = groups.popitem()
+            return await node.mget(keys)
+        results = await asyncio.gather(
+            *(
+                node.mget([keys[position] for position in positions])
+                for node, positions in groups.items()
+            ),
+            return_exceptions=True,
+        )
+        values: List[Optional[bytes]] = [None] * len(keys)
+        failed, errors = [], []
+        for positions, result in zip(groups.values(), results):
+            if isinstance(result, BaseException):
+                failed.extend(positions)
+                errors.append(result)
+                continue
+            for position, value in zip(positions, result):
+                values[position] = value
+        if len(errors) == len(groups):
+            raise errors[0]
+        if errors:
+            raise ShardsUnavailableError(values, sorted(failed), errors[0])
+        return values
+
+    def pubsub(self):
+        return self.pubsub_node.pubsub()
+
+    def pipeline(self, transaction: bool = True):
+        if len(self.nodes) == 1:
+            return self.pubsub_node.pipeline(transaction=transaction)
+        return ShardedPipeline(self)
+
+
+class ShardedPipeline:
+    """Pipeline of commands split by node, executed on all nodes concurrently.
+
+    Nodes run their commands independently: a failed node doesn't undo the
+    commands of the others, the first error is raised after all are done.
+    """
+
+    def __init__(self, redis: ShardedRedis):
+        self._redis = redis
+        self._commands: List[Tuple[Redis, str, tuple, dict]] = []
+
+    def __getattr__(self, command: str):
+        def queue_command(key: str, *args, **kwargs) -> "ShardedPipeline":
+            node = self._redis.get_node(key)
+            self._commands.append((node, command, (key, *args), kwargs))
+            return self
+
+        return queue_command
+
+    def delete(self, *keys: str) -> "ShardedPipeline":
+        for node, positions in self._redis.group_keys(list(keys)).items():
+            node_keys = tuple(keys[position] for position in positions)
+            self._commands.append((node, "delete", node_keys, {}))
+        return self
+
+    def publish(self, channel: str, message: str) -> "ShardedPipeline":
+        node = self._redis.pubsub_node
+        self._commands.append((node, "publish", (channel, message), {}))
+        return self
+
+    async def execute(self) -> List[Any]:
+        """Results of the commands sent to every node, in the order of nodes"""
+        commands, self._commands = self._commands, []
+        by_node = defaultdict(list)
+        for node, command, args, kwargs in commands:
+            by_node[node].append((command, args, kwargs))
+        results = await asyncio.gather(
+            *(self._execute_on(node, commands) for node, commands in by_node.items()),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return [value for node_results in results for value in node_results]
+
+    @staticmethod
+    async def _execute_on(node: Redis, commands: List[Tuple[str, tuple, dict]]):
+        async with node.pipeline(transaction=False) as pipeline:
+            for command, args, kwargs in commands:
+                getattr(pipeline, command)(*args, **kwargs)
+            return await pipeline.execute()
+
+    async def __aenter__(self) -> "ShardedPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._commands = []
+
+
+async def prewarm_redis_pool(connections: int, client: Redis = None) -> int:
+    """Open connections of the pool ahead of requests, return how many were opened.
+
+    Without `client` pools of all the nodes are prewarmed.
+    """
+    if client is None:
+        opened = await asyncio.gather(
+            *(
+                prewarm_redis_pool(connections, node)
+                for node in redis_client.nodes.values()
+            )
+        )
+        return sum(opened)
+    pool = client.connection_pool
+    connections = min(connections, pool.max_connections)
+    results = await asyncio.gather(
+        *(pool.get_connection("PING") for _ in range(connections)),
+        return_exceptions=True,
+    )
+    errors = []
+    for result in results:
+        if isinstance(result, BaseException):
+            errors.append(result)
+        else:
+            await pool.release(result)
+    if errors:
+        raise errors[0]
+    return connections
+
+
+redis_client = ShardedRedis(
+    {
+        str(url): make_redis_client(str(url))
+        for url in config.REDIS_NODES or [config.REDIS_URL]
+    },
+    config.REDIS_VIRTUAL_NODES,
+)
@@ -1,14 +1,33 @@
 from pydantic import AnyHttpUrl, BaseSettings
 
 from config.auth import AuthConfig
+from config.caching import CachingConfig
 from config.database import DatabaseConfig
+from config.hashing import HashingConfig
+from config.load_shedding import LoadSheddingConfig
+from config.logging import LoggingConfig
 from config.redis import RedisConfig
+from config.server import ServerConfig
+from config.user_filter import UserFilterConfig
+from config.warmup import WarmupConfig
 
 
-class Config(BaseSettings, AuthConfig, DatabaseConfig, RedisConfig):
+class Config(
+    BaseSettings,
+    AuthConfig,
+    CachingConfig,
+    DatabaseConfig,
+    HashingConfig,
+    LoadSheddingConfig,
+    LoggingConfig,
+    RedisConfig,
+    ServerConfig,
+    UserFilterConfig,
+    WarmupConfig,
+):
     SERVER_HOST: AnyHttpUrl = "http://localhost:8000"
     WORKERS: int = 1
-    IS_DEBUG: bool = True
+    IS_DEBUG: bool = False
 
 
 config = Config()
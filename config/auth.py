@@ -1,11 +1,13 @@
 from fastapi_jwt_auth import AuthJWT
-from pydantic import BaseModel
+from pydantic import BaseModel, NonNegativeInt
 
 
 class AuthConfig(BaseModel):
     authjwt_secret_key: str = (
         "ec5d56eaef1ef227718c8711c142cb46dba477f1812b8b556a3629d2aa720425"
     )
+    # verified access tokens kept to skip verifying them again, 0 disables it
+    JWT_CACHE_SIZE: NonNegativeInt = 10000
 
 
 @AuthJWT.load_config
@@ -0,0 +1,26 @@
+from typing import Dict, Literal
+
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat, PositiveInt, confloat
+
+
+class CachingConfig(BaseModel):
+    # entries kept in the in-process cache of every worker, 0 disables it
+    LOCAL_CACHE_SIZE: NonNegativeInt = 10000
+    # seconds an entry lives in the in-process cache
+    LOCAL_CACHE_TTL: PositiveFloat = 5.0
+    # redis pub/sub channel used to drop keys from the cache of all workers
+    CACHE_INVALIDATION_CHANNEL: str = "cache:invalidate"
+    # seconds a key lives in redis, by key namespace (part of the key before ":")
+    CACHE_TTL: PositiveInt = 3600
+    CACHE_NAMESPACE_TTLS: Dict[str, PositiveInt] = {"Users": 3600}
+    # spread of key lifetimes (0.1 means +-10%), so keys don't expire together
+    CACHE_TTL_JITTER: confloat(ge=0, lt=1) = 0.1
+    # seconds a missing entry is remembered as missing, 0 disables it
+    CACHE_TOMBSTONE_TTL: NonNegativeInt = 30
+    # let only one worker load a missing key, others wait for it in the cache
+    CACHE_LOCK_ENABLED: bool = False
+    # seconds the lock is held at most and other workers wait for the key
+    CACHE_LOCK_TIMEOUT: PositiveFloat = 1.0
+    CACHE_LOCK_POLL_INTERVAL: PositiveFloat = 0.02
+    # serialization format of values stored in redis
+    CACHE_CODEC: Literal["json", "orjson", "msgpack"] = "orjson"
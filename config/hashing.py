@@ -0,0 +1,10 @@
+from pydantic import BaseModel, PositiveFloat, PositiveInt
+
+
+class HashingConfig(BaseModel):
+    # processes hashing passwords outside of the event loop
+    HASHING_WORKERS: PositiveInt = 2
+    # hashes allowed to run or wait for a free process at the same time
+    HASHING_QUEUE_SIZE: PositiveInt = 32
+    # seconds to wait for a free place in the queue before giving up
+    HASHING_QUEUE_TIMEOUT: PositiveFloat = 5.0
@@ -0,0 +1,23 @@
+from typing import Dict
+
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat, PositiveInt
+
+
+class LoadSheddingConfig(BaseModel):
+    # cap requests processed at once by every worker, the rest wait in a queue
+    LOAD_SHEDDING_ENABLED: bool = True
+    # requests processed at once by a worker, most reads are served by the
+    # cache, so it is above DATABASE_POOL_SIZE
+    LOAD_SHEDDING_MAX_IN_FLIGHT: PositiveInt = 64
+    # requests of every route class processed at once: read, write and signup
+    LOAD_SHEDDING_CLASS_LIMITS: Dict[str, PositiveInt] = {
+        "read": 64,
+        "write": 16,
+        "signup": 4,
+    }
+    # requests waiting for a free slot, more are rejected at once
+    LOAD_SHEDDING_QUEUE_SIZE: NonNegativeInt = 256
+    # seconds a request waits for a free slot before it is rejected
+    LOAD_SHEDDING_QUEUE_TIMEOUT: PositiveFloat = 1.0
+    # seconds rejected clients are asked to wait before retrying
+    LOAD_SHEDDING_RETRY_AFTER: PositiveInt = 1
@@ -0,0 +1,18 @@
+from typing import Dict, Literal
+
+from pydantic import BaseModel, PositiveInt, confloat
+
+
+class LoggingConfig(BaseModel):
+    LOG_LEVEL: Literal["DEBUG", "INFO", "WARNING", "ERROR"] = "INFO"
+    # "json" renders extra fields of records as keys of one JSON object per line
+    LOG_FORMAT: Literal["text", "json"] = "json"
+    # records waiting for the writer thread, records over it are dropped
+    LOG_QUEUE_SIZE: PositiveInt = 10000
+    # share of INFO and DEBUG records kept per logger name, warnings are never sampled
+    LOG_SAMPLE_RATES: Dict[str, confloat(ge=0, le=1)] = {
+        "services.user": 0.01,
+        "uvicorn.access": 0.1,
+    }
+    # log every request, sampled by "uvicorn.access" rate
+    ACCESS_LOG: bool = False
@@ -1,5 +1,22 @@
-from pydantic import AnyUrl, BaseModel
+from typing import List
+
+from pydantic import AnyUrl, BaseModel, NonNegativeInt, PositiveFloat, PositiveInt
 
 
 class RedisConfig(BaseModel):
     REDIS_URL: AnyUrl = "redis://localhost"
+    # nodes the cache is sharded across by consistent hashing, instead of
+    # REDIS_URL, pub/sub goes to the first one
+    REDIS_NODES: List[AnyUrl] = []
+    # points of every node on the hash ring, more spread keys more evenly
+    REDIS_VIRTUAL_NODES: PositiveInt = 160
+    # connections kept by every worker, callers wait for a free one when all
+    # are busy up to REDIS_POOL_TIMEOUT seconds
+    REDIS_MAX_CONNECTIONS: PositiveInt = 50
+    REDIS_POOL_TIMEOUT: PositiveFloat = 1.0
+    REDIS_CONNECT_TIMEOUT: PositiveFloat = 1.0
+    REDIS_READ_TIMEOUT: PositiveFloat = 1.0
+    # seconds of idleness after which connection is checked before use, 0 disables
+    REDIS_HEALTH_CHECK_INTERVAL: NonNegativeInt = 30
+    # connections opened on startup, before the first requests need them
+    REDIS_PREWARM_CONNECTIONS: NonNegativeInt = 5
@@ -0,0 +1,25 @@
+from typing import Literal
+
+from pydantic import BaseModel, NonNegativeInt, PositiveInt
+
+
+class ServerConfig(BaseModel):
+    # process manager of the workers: uvicorn, or gunicorn pre-forking
+    # uvicorn workers, which recycles them and can preload the app
+    SERVER_RUNTIME: Literal["uvicorn", "gunicorn"] = "uvicorn"
+    # event loop and HTTP parser of the workers, auto picks uvloop and
+    # httptools when they are installed
+    SERVER_LOOP: Literal["auto", "asyncio", "uvloop"] = "uvloop"
+    SERVER_HTTP: Literal["auto", "h11", "httptools"] = "httptools"
+    # seconds an idle keep-alive connection is kept open, above the idle
+    # timeout of the load balancer in front of the workers
+    SERVER_KEEP_ALIVE: PositiveInt = 75
+    # connections waiting to be accepted by the listening socket
+    SERVER_BACKLOG: PositiveInt = 2048
+    # gunicorn only: build the app before forking, so the workers share it
+    # copy-on-write instead of building their own
+    SERVER_PRELOAD: bool = True
+    # gunicorn only: requests after which a worker is replaced, 0 disables,
+    # jitter spreads the restarts of the workers
+    SERVER_MAX_REQUESTS: NonNegativeInt = 0
+    SERVER_MAX_REQUESTS_JITTER: NonNegativeInt = 0
@@ -0,0 +1,16 @@
+from pydantic import BaseModel, NonNegativeInt, PositiveInt, confloat
+
+
+class UserFilterConfig(BaseModel):
+    # keep filters of existing user ids and logins in every worker, built on
+    # startup, to skip lookups of missing users and hashing for taken logins
+    USER_FILTER_ENABLED: bool = True
+    # share of lookups of missing users the filters let through
+    USER_FILTER_ERROR_RATE: confloat(gt=0, lt=1) = 0.01
+    # users the filters are sized for at least, they are sized for twice the
+    # users in the table when there are more
+    USER_FILTER_CAPACITY: PositiveInt = 100000
+    # ids this far below the highest scanned id may still be committed after
+    # the scan (sequence values are committed out of order), so their
+    # absence from the filters isn't trusted
+    USER_FILTER_ID_MARGIN: NonNegativeInt = 1000
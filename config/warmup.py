@@ -0,0 +1,25 @@
+from typing import Literal
+
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat, PositiveInt
+
+
+class WarmupConfig(BaseModel):
+    # load users into the cache in the background when a worker starts,
+    # only one worker of the deploy does it
+    WARMUP_ON_STARTUP: bool = False
+    # "hot" - most read users, "recent" - most recently created users
+    WARMUP_SOURCE: Literal["hot", "recent"] = "hot"
+    WARMUP_USERS: NonNegativeInt = 1000
+    # users loaded per second at most, keeps warm-up from taking the db pool
+    WARMUP_RATE: PositiveInt = 500
+    # seconds the warm-up lock outlives the expected warm-up duration,
+    # WARMUP_USERS / WARMUP_RATE, in case the worker dies without releasing it
+    WARMUP_LOCK_MARGIN: PositiveFloat = 30.0
+    # seconds after a warm-up in which starting workers don't warm up again,
+    # e.g. the rest of a deploy or workers recycled by SERVER_MAX_REQUESTS
+    WARMUP_REPEAT_INTERVAL: PositiveInt = 3600
+    # seconds between writes of user read counts of a worker to redis
+    HOT_USERS_FLUSH_INTERVAL: PositiveFloat = 10.0
+    # users with most reads kept in the statistics, and seconds they are kept for
+    HOT_USERS_SIZE: PositiveInt = 10000
+    HOT_USERS_TTL: PositiveInt = 86400
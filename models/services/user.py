@@ -1,51 +1,140 @@
-from typing import Optional
+from typing import AsyncIterator, List, Optional, Tuple
 
 from pydantic.types import PositiveInt
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import select
 
-from clients.database import get_session
+from clients.database import RecentWrites, get_read_session, get_session
+from config import config
 from models.user import User
+from services.metrics import DB_QUERY_DURATION, timed
 from utils.errors import UserAlreadyExistError
 
+# dialect specific INSERT statements, supporting ON CONFLICT clause
+INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# ids and logins of users written by this worker, read back from the primary
+recent_writes = RecentWrites(config.DATABASE_READ_YOUR_WRITES_TTL)
+
 
 class UserDBService:
     @staticmethod
-    def create_user(login: str, password: str) -> User:
-        with get_session() as session:
-            user = User(login=login, password=password)
-            session.add(user)
-            try:
-                session.commit()
-                session.refresh(user)
-            except IntegrityError:
-                session.rollback()
-                session.close()
-                raise UserAlreadyExistError
+    @timed(DB_QUERY_DURATION, "create_user")
+    async def create_user(login: str, password: str) -> User:
+        """Insert user in one statement, skipping the insert on taken login"""
+        async with get_session() as session:
+            dialect = session.bind.dialect
+            statement = (
+                INSERTS[dialect.name](User)
+                .values(login=login, password=password)
+                .on_conflict_do_nothing(index_elements=[User.login])
+            )
+            if dialect.full_returning:
+                result = await session.execute(
+                    statement.returning(*User.__table__.columns)
+                )
+                row = result.first()
+                user = User(**row._mapping) if row else None
+            else:
+                # sqlite has no RETURNING in sqlalchemy 1.4,
+                # but the rest of the row is known already
+                result = await session.execute(statement)
+                user = None
+                if result.rowcount:
+                    user_id = result.inserted_primary_key[0]
+                    user = User(id=user_id, login=login, password=password)
+            await session.commit()
+        if not user:
+            raise UserAlreadyExistError
+        recent_writes.add(user.id)
+        recent_writes.add(("login", login))
         return user
 
     @staticmethod
-    def get_user(
-        user_id: Optional[PositiveInt] = None, login: Optional[str] = None
+    @timed(DB_QUERY_DURATION, "get_user")
+    async def get_user(
+        user_id: Optional[PositiveInt] = None,
+        login: Optional[str] = None,
+        primary: bool = False,
     ) -> Optional[User]:
-        filters = []
+        """Read user from a replica, from the primary if it was just written"""
+        primary = (
+            primary or user_id in recent_writes or ("login", login) in recent_writes
+        )
+        statement = select(User)
         if user_id:
-            filters.append(User.id == user_id)
+            statement = statement.where(User.id == user_id)
         if login:
-            filters.append(User.login == login)
-        with get_session() as session:
-            result = session.query(User).filter(*filters).first()
-        return result
+            statement = statement.where(User.login == login)
+        async with get_read_session(primary) as session:
+            result = await session.exec(statement.limit(1))
+            return result.first()
+
+    @staticmethod
+    @timed(DB_QUERY_DURATION, "get_users")
+    async def get_users(
+        user_ids: List[PositiveInt], primary: bool = False
+    ) -> List[User]:
+        primary = primary or any(user_id in recent_writes for user_id in user_ids)
+        async with get_read_session(primary) as session:
+            result = await session.exec(select(User).where(User.id.in_(user_ids)))
+            return result.all()
+
+    @staticmethod
+    @timed(DB_QUERY_DURATION, "get_recent_user_ids")
+    async def get_recent_user_ids(limit: int) -> List[int]:
+        """Ids of the most recently created users, newest first"""
+        statement = select(User.id).order_by(User.id.desc()).limit(limit)
+        async with get_read_session() as session:
+            result = await session.exec(statement)
+            return result.all()
 
     @staticmethod
-    def update_user(
-        user_model: User, password: Optional[str] = None, name: Optional[str] = None
-    ) -> User:
-        if password:
-            user_model.password = password
-        if name:
-            user_model.name = name
-        with get_session() as session:
-            session.add(user_model)
-            session.commit()
-            session.refresh(user_model)
-        return user_model
+    @timed(DB_QUERY_DURATION, "count_users")
+    async def count_users(primary: bool = False) -> int:
+        async with get_read_session(primary) as session:
+            result = await session.exec(select(func.count(User.id)))
+            return result.one()
+
+    @staticmethod
+    async def stream_user_keys(
+        batch_size: int = 1000, primary: bool = False
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """Ids and logins of all users, fetched by batches of a server-side cursor"""
+        statement = select(User.id, User.login).execution_options(yield_per=batch_size)
+        async with get_read_session(primary) as session:
+            result = await session.stream(statement)
+            async for user_id, login in result:
+                yield user_id, login
+
+    @staticmethod
+    @timed(DB_QUERY_DURATION, "update_user")
+    async def update_user(
+        user_id: PositiveInt,
+        password: Optional[str] = None,
+        name: Optional[str] = None,
+    ) -> Optional[User]:
+        """Update user in one statement, return `None` if user doesn't exist"""
+        values = {"password": password, "name": name}
+        values = {field: value for field, value in values.items() if value}
+        if not values:
+            return await UserDBService.get_user(user_id)
+        statement = update(User).where(User.id == user_id).values(**values)
+        async with get_session() as session:
+            if session.bind.dialect.full_returning:
+                result = await session.execute(
+                    statement.returning(*User.__table__.columns)
+                )
+            else:
+                # sqlite has no RETURNING in sqlalchemy 1.4,
+                # read the row back in the same transaction
+                await session.execute(statement)
+                result = await session.execute(
+                    select(User.__table__).where(User.id == user_id)
+                )
+            row = result.first()
+            await session.commit()
+        recent_writes.add(user_id)
+        if row:
+            return User(**row._mapping)
@@ -1,7 +1,11 @@
 from typing import Optional
 
+from pydantic import PositiveInt, conlist
 from sqlmodel import Field, SQLModel
 
+# max amount of users requested at once
+USERS_BATCH_SIZE = 100
+
 
 class AuthUser(SQLModel):
     login: str = Field(unique=True)
@@ -22,3 +26,13 @@ class CreateUser(User):
 
     # class Config:
     #     fields = {"password": {"exclude": True}}
+
+
+class UsersBatch(SQLModel):
+    ids: conlist(PositiveInt, min_items=1, max_items=USERS_BATCH_SIZE)
+
+
+class BatchUser(SQLModel):
+    id: int
+    found: bool
+    user: Optional[User] = None
@@ -1,7 +1,238 @@
+import asyncio
 import json
-from typing import Optional, Union
+import logging
+import random
+import time
+from collections import Counter, OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from uuid import uuid4
 
-from clients.redis import redis_client
+import msgpack
+import orjson
+from aioredis.exceptions import ConnectionError, RedisError, TimeoutError
+
+from clients.redis import ShardsUnavailableError, redis_client
+from config import config
+from services.metrics import (
+    CACHE_REQUESTS,
+    REDIS_COMMAND_DURATION,
+    TOMBSTONE_HITS,
+    measure,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Codec:
+    """Serializes cached values.
+
+    Encoded values start with the tag of their format, so values written
+    with one codec can still be read after switching `CACHE_CODEC` to another.
+    """
+
+    tag: bytes
+
+    def encode(self, value: Any) -> bytes:
+        return self.tag + self.dumps(value)
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    tag = b"J1"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    tag = b"M1"
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data)
+
+
+CODECS = {"json": JsonCodec, "orjson": OrjsonCodec, "msgpack": MsgpackCodec}
+
+codec: Codec = CODECS[config.CACHE_CODEC]()
+# readers of every known format, the configured codec reads its own one
+decoders: Dict[bytes, Codec] = {
+    **{codec_class.tag: codec_class() for codec_class in (JsonCodec, MsgpackCodec)},
+    codec.tag: codec,
+}
+
+
+def decode_value(data: bytes) -> Any:
+    decoder = decoders.get(data[:2])
+    if decoder is None:
+        # values written before codecs were introduced are plain json
+        return json.loads(data)
+    return decoder.loads(data[2:])
+
+
+def render_json(data: bytes, value: Any) -> bytes:
+    """JSON of the stored value, reusing stored bytes when they are JSON already"""
+    tag = data[:2]
+    if tag == JsonCodec.tag:
+        return data[2:]
+    if tag not in decoders:
+        return data
+    return orjson.dumps(value)
+
+
+class LocalCache:
+    """Size-bounded LRU cache with TTL, living in the memory of one worker"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.maxsize:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one call.
+
+    The first caller starts the call, the others await its result (or its
+    exception). A cancelled caller doesn't cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(func())
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(call)
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class HitCounter:
+    """Counts hits of members in the worker, flushed to a shared sorted set.
+
+    Counting in memory keeps redis off the path of the counted requests.
+    """
+
+    def __init__(self, key: str, size: int, ttl: int):
+        self.key = key
+        self.size = size
+        self.ttl = ttl
+        self._counts: Counter = Counter()
+
+    def record(self, member: Hashable) -> None:
+        self._counts[member] += 1
+
+    async def flush(self) -> None:
+        counts, self._counts = self._counts, Counter()
+        if counts:
+            await CachingService.increment_scores(self.key, counts, self.size, self.ttl)
+
+    async def flush_forever(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except (ConnectionError, TimeoutError):
+                logger.warning("failed to flush hit counts of %s", self.key)
+
+
+# only the owner of the lock may release it
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+local_cache = LocalCache(config.LOCAL_CACHE_SIZE, config.LOCAL_CACHE_TTL)
+
+
+def get_namespace(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def tombstone_key(key: str) -> str:
+    """Key marking the entry of the key as missing, apart from the entries"""
+    return f"Tombstone:{key}"
+
+
+def count_lookup(key: str, result: str) -> None:
+    CACHE_REQUESTS.inc(get_namespace(key), result)
+
+
+async def read_redis(command: str, keys: List[str], *args) -> Any:
+    """Run redis read command, counting its failure as error of every key"""
+    try:
+        with measure(REDIS_COMMAND_DURATION, command):
+            return await getattr(redis_client, command)(*args)
+    except ShardsUnavailableError as error:
+        for position in error.failed:
+            count_lookup(keys[position], "error")
+        raise
+    except RedisError:
+        for key in keys:
+            count_lookup(key, "error")
+        raise
 
 
 class CachingService:
@@ -9,17 +240,249 @@ class CachingService:
     async def get_value(
         key: str,
     ) -> Optional[Union[str, dict, list, bytes, int, float]]:
-        value = await redis_client.get(key)
-        if value:
-            return json.loads(value)
+        value = local_cache.get(key)
+        if value is not None:
+            count_lookup(key, "local_hit")
+            return value
+        try:
+            value = await read_redis("get", [key], key)
+        except RedisError as error:
+            # the key is loaded as if missing while its cache node is down
+            logger.warning("cache node is unavailable: %s", error)
+            return None
+        if not value:
+            count_lookup(key, "miss")
+            return None
+        count_lookup(key, "hit")
+        value = decode_value(value)
+        local_cache.set(key, value)
+        return value
 
     @staticmethod
     async def set_value(
-        key: str, value: Union[str, dict, list, bytes, int, float]
+        key: str,
+        value: Union[str, dict, list, bytes, int, float],
+        ttl: Optional[int] = None,
+    ) -> None:
+        new_value = codec.encode(value)
+        local_cache.set(key, value)
+        try:
+            with measure(REDIS_COMMAND_DURATION, "set"):
+                return await redis_client.set(
+                    key, new_value, ex=ttl or CachingService.get_ttl(key)
+                )
+        except RedisError as error:
+            # the value is loaded again once its cache node is back
+            logger.warning("cache write is skipped: %s", error)
+
+    @staticmethod
+    async def replace_value(
+        key: str,
+        value: Union[str, dict, list, bytes, int, float],
+        ttl: Optional[int] = None,
+    ) -> None:
+        """Set the value and drop the old one from the cache of all workers"""
+        local_cache.set(key, value)
+        try:
+            async with redis_client.pipeline(transaction=False) as pipeline:
+                pipeline.set(
+                    key, codec.encode(value), ex=ttl or CachingService.get_ttl(key)
+                )
+                pipeline.publish(config.CACHE_INVALIDATION_CHANNEL, key)
+                with measure(REDIS_COMMAND_DURATION, "replace_value"):
+                    await pipeline.execute()
+        except RedisError as error:
+            logger.warning("cache write is skipped: %s", error)
+
+    @staticmethod
+    async def get_json(key: str) -> Optional[bytes]:
+        """Get value rendered as JSON, without building any models from it"""
+        value = local_cache.get(key)
+        if value is not None:
+            count_lookup(key, "local_hit")
+            return orjson.dumps(value)
+        try:
+            data = await read_redis("get", [key], key)
+        except RedisError as error:
+            logger.warning("cache node is unavailable: %s", error)
+            return None
+        if not data:
+            count_lookup(key, "miss")
+            return None
+        count_lookup(key, "hit")
+        value = decode_value(data)
+        local_cache.set(key, value)
+        return render_json(data, value)
+
+    @staticmethod
+    async def get_many(
+        keys: List[str],
+    ) -> List[Optional[Union[str, dict, list, bytes, int, float]]]:
+        """Get values of the keys in one MGET per cache node, in order of the keys"""
+        values = [local_cache.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        for key, value in zip(keys, values):
+            if value is not None:
+                count_lookup(key, "local_hit")
+        if not missing:
+            return values
+        missing_keys = [keys[i] for i in missing]
+        failed = set()
+        try:
+            redis_values = await read_redis("mget", missing_keys, missing_keys)
+        except ShardsUnavailableError as error:
+            # keys of the unavailable cache nodes are loaded as if missing
+            logger.warning("cache nodes are unavailable: %s", error)
+            redis_values = error.values
+            failed = {missing[position] for position in error.failed}
+        except RedisError as error:
+            # all the keys are on unavailable cache nodes
+            logger.warning("cache nodes are unavailable: %s", error)
+            redis_values = [None] * len(missing)
+            failed = set(missing)
+        for i, value in zip(missing, redis_values):
+            if i in failed:
+                continue
+            if not value:
+                count_lookup(keys[i], "miss")
+                continue
+            count_lookup(keys[i], "hit")
+            values[i] = decode_value(value)
+            local_cache.set(keys[i], values[i])
+        return values
+
+    @staticmethod
+    async def set_many(
+        values: Dict[str, Union[str, dict, list, bytes, int, float]],
+        ttl: Optional[int] = None,
     ) -> None:
-        new_value = json.dumps(value)
-        return await redis_client.set(key, new_value)
+        """Set values of the keys in one pipelined round trip"""
+        if not values:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipeline:
+                for key, value in values.items():
+                    local_cache.set(key, value)
+                    pipeline.set(
+                        key, codec.encode(value), ex=ttl or CachingService.get_ttl(key)
+                    )
+                with measure(REDIS_COMMAND_DURATION, "set_many"):
+                    await pipeline.execute()
+        except RedisError as error:
+            # values of the unavailable cache nodes are loaded again later
+            logger.warning("cache write is skipped: %s", error)
+
+    @staticmethod
+    def get_ttl(key: str) -> int:
+        """Lifetime of the key in seconds: TTL of its namespace with jitter"""
+        ttl = config.CACHE_NAMESPACE_TTLS.get(get_namespace(key), config.CACHE_TTL)
+        jitter = random.uniform(-config.CACHE_TTL_JITTER, config.CACHE_TTL_JITTER)
+        return max(1, round(ttl * (1 + jitter)))
 
     @staticmethod
     async def delete_key(key: str) -> None:
-        return await redis_client.delete(*[key])
+        return await CachingService.delete_many([key])
+
+    @staticmethod
+    async def get_tombstones(keys: List[str]) -> List[bool]:
+        """Whether entries of the keys are known to be missing, in one MGET"""
+        if not config.CACHE_TOMBSTONE_TTL:
+            return [False] * len(keys)
+        values = await CachingService.get_many([tombstone_key(key) for key in keys])
+        for key, value in zip(keys, values):
+            if value is not None:
+                TOMBSTONE_HITS.inc(get_namespace(key))
+        return [value is not None for value in values]
+
+    @staticmethod
+    async def set_tombstones(keys: List[str]) -> None:
+        """Remember entries of the keys as missing for CACHE_TOMBSTONE_TTL"""
+        if not config.CACHE_TOMBSTONE_TTL:
+            return
+        await CachingService.set_many(
+            {tombstone_key(key): 1 for key in keys}, ttl=config.CACHE_TOMBSTONE_TTL
+        )
+
+    @staticmethod
+    async def delete_tombstones(keys: List[str]) -> None:
+        await CachingService.delete_many([tombstone_key(key) for key in keys])
+
+    @staticmethod
+    async def delete_many(keys: List[str]) -> None:
+        """Delete the keys from the cache of all workers in one round trip"""
+        if not keys:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipeline:
+                pipeline.delete(*keys)
+                for key in keys:
+                    local_cache.delete(key)
+                    # drop the key from the in-process cache of the other workers
+                    pipeline.publish(config.CACHE_INVALIDATION_CHANNEL, key)
+                with measure(REDIS_COMMAND_DURATION, "delete_many"):
+                    await pipeline.execute()
+        except RedisError as error:
+            # keys of the unavailable cache nodes are unreadable until they
+            # are back, the keys of the others are deleted
+            logger.warning("cache delete is skipped: %s", error)
+
+    @staticmethod
+    async def increment_scores(
+        key: str, scores: Dict[Hashable, float], size: int, ttl: int
+    ) -> None:
+        """Add to scores of a sorted set, keeping only `size` top members"""
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            for member, score in scores.items():
+                pipeline.zincrby(key, score, member)
+            pipeline.zremrangebyrank(key, 0, -size - 1)
+            pipeline.expire(key, ttl)
+            with measure(REDIS_COMMAND_DURATION, "increment_scores"):
+                await pipeline.execute()
+
+    @staticmethod
+    async def get_top_members(key: str, count: int) -> List[bytes]:
+        """Members of a sorted set with the highest scores first"""
+        if not count:
+            return []
+        with measure(REDIS_COMMAND_DURATION, "zrevrange"):
+            return await redis_client.zrevrange(key, 0, count - 1)
+
+    @staticmethod
+    async def acquire_lock(key: str, timeout: Optional[float] = None) -> Optional[str]:
+        """Take short redis lock on the key, return its token if it is taken"""
+        token = uuid4().hex
+        timeout = timeout or config.CACHE_LOCK_TIMEOUT
+        if await redis_client.set(
+            f"Lock:{key}", token, nx=True, px=int(timeout * 1000)
+        ):
+            return token
+
+    @staticmethod
+    async def release_lock(key: str, token: str) -> None:
+        await redis_client.eval(RELEASE_LOCK_SCRIPT, 1, f"Lock:{key}", token)
+
+    @staticmethod
+    async def listen_invalidations(reconnect_delay: float = 1.0) -> None:
+        """Drop keys published to the invalidation channel from the local cache.
+
+        Runs for the whole life of the worker. Invalidations published while
+        the subscription is down are lost, so the local cache is cleared
+        every time the subscription is (re)established.
+        """
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(config.CACHE_INVALIDATION_CHANNEL)
+                local_cache.clear()
+                while True:
+                    # blocking reads would fail on REDIS_READ_TIMEOUT
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                    if message:
+                        local_cache.delete(message["data"].decode())
+            except (ConnectionError, TimeoutError):
+                logger.warning("cache invalidation channel is unavailable")
+                await asyncio.sleep(reconnect_delay)
+            finally:
+                await pubsub.reset()
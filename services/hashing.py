@@ -1,9 +1,60 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
 
+from config import config
+from utils.errors import HashingQueueFullError
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 class HasherService:
+    _executor: Optional[ProcessPoolExecutor] = None
+    _queue: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
     @staticmethod
     def get_password_hash(password):
         return pwd_context.hash(password)
+
+    @classmethod
+    async def hash_password(cls, password: str) -> str:
+        """Hash password in the process pool without blocking the event loop.
+
+        At most `HASHING_QUEUE_SIZE` hashes run or wait for a process at once,
+        the rest wait for a free place up to `HASHING_QUEUE_TIMEOUT` seconds
+        and then fail with `HashingQueueFullError`.
+        """
+        queue = cls._get_queue()
+        try:
+            await asyncio.wait_for(queue.acquire(), config.HASHING_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HashingQueueFullError
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                cls._get_executor(), cls.get_password_hash, password
+            )
+        finally:
+            queue.release()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Stop the process pool without blocking the event loop on queued hashes"""
+        if cls._executor:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
+    @classmethod
+    def _get_executor(cls) -> ProcessPoolExecutor:
+        if not cls._executor:
+            cls._executor = ProcessPoolExecutor(max_workers=config.HASHING_WORKERS)
+        return cls._executor
+
+    @classmethod
+    def _get_queue(cls) -> asyncio.Semaphore:
+        # semaphore is bound to the event loop it was created in
+        loop = asyncio.get_running_loop()
+        if not cls._queue or cls._queue[0] is not loop:
+            cls._queue = (loop, asyncio.Semaphore(config.HASHING_QUEUE_SIZE))
+        return cls._queue[1]
@@ -0,0 +1,246 @@
+import bisect
+import functools
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+from clients.database import get_pool_stats
+
+# upper bounds of latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    labels = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return f"{{{labels}}}"
+
+
+class Metric:
+    type: str
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self.samples()
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labelvalues, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, *labelvalues) -> None:
+        self.values[labelvalues] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # per labels: counts of observations in every bucket (last is +Inf), sum
+        self.values: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labelvalues) -> None:
+        counts_and_sum = self.values.get(labelvalues)
+        if counts_and_sum is None:
+            counts_and_sum = ([0] * (len(self.buckets) + 1), [0.0])
+            self.values[labelvalues] = counts_and_sum
+        counts, total = counts_and_sum
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self) -> Iterator[str]:
+        labelnames = (*self.labelnames, "le")
+        for labelvalues, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = _format_labels(labelnames, (*labelvalues, bound))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {total[0]}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class DBPoolMetrics:
+    """Metrics of the database connection pool, read from it on rendering"""
+
+    def render(self) -> Iterator[str]:
+        stats = get_pool_stats()
+        if not stats:
+            return
+        yield "# HELP db_pool_connections Connections of the database pool by state"
+        yield "# TYPE db_pool_connections gauge"
+        for state in ("size", "checked_out", "checked_in", "overflow"):
+            yield f'db_pool_connections{{state="{state}"}} {stats[state]}'
+        if "checkouts" not in stats:
+            return
+        yield "# HELP db_pool_timeouts_total Connection checkouts which timed out"
+        yield "# TYPE db_pool_timeouts_total counter"
+        yield f"db_pool_timeouts_total {stats['timeouts']}"
+        yield "# HELP db_pool_wait_seconds Time spent waiting for a connection"
+        yield "# TYPE db_pool_wait_seconds histogram"
+        for bound, count in stats["wait_time_buckets"]:
+            yield f'db_pool_wait_seconds_bucket{{le="{bound}"}} {count}'
+        yield f"db_pool_wait_seconds_sum {stats['wait_time_sum']}"
+        yield f"db_pool_wait_seconds_count {stats['checkouts']}"
+        yield "# HELP db_pool_connect_seconds Time spent opening new connections"
+        yield "# TYPE db_pool_connect_seconds summary"
+        yield f"db_pool_connect_seconds_sum {stats['connect_time_sum']}"
+        yield f"db_pool_connect_seconds_count {stats['connects']}"
+
+
+class MetricsRegistry:
+    """Metrics of one worker process, rendered in Prometheus text format.
+
+    Every worker keeps its own metrics, so with several `WORKERS` each scrape
+    shows the worker which happened to serve it.
+    """
+
+    def __init__(self):
+        self.metrics: List[Union[Metric, DBPoolMetrics]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = (line for metric in self.metrics for line in metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time spent processing HTTP requests",
+        ("method", "route", "status"),
+    )
+)
+CACHE_REQUESTS = registry.register(
+    Counter(
+        "cache_requests_total",
+        "Cache lookups by key namespace and result: local_hit, hit, miss or error",
+        ("namespace", "result"),
+    )
+)
+TOMBSTONE_HITS = registry.register(
+    Counter(
+        "cache_tombstone_hits_total",
+        "Database queries avoided by cached tombstones of missing entries",
+        ("namespace",),
+    )
+)
+DB_QUERY_DURATION = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "Time spent in database queries of UserDBService",
+        ("operation",),
+    )
+)
+REDIS_COMMAND_DURATION = registry.register(
+    Histogram(
+        "redis_command_duration_seconds",
+        "Time spent in redis commands of CachingService",
+        ("command",),
+    )
+)
+LOAD_SHEDDING_IN_FLIGHT = registry.register(
+    Gauge(
+        "load_shedding_in_flight_requests",
+        "Requests being processed by route class",
+        ("route_class",),
+    )
+)
+LOAD_SHEDDING_QUEUE_DEPTH = registry.register(
+    Gauge(
+        "load_shedding_queue_depth",
+        "Requests waiting for a free slot by route class",
+        ("route_class",),
+    )
+)
+LOAD_SHEDDING_REJECTED = registry.register(
+    Counter(
+        "load_shedding_rejected_total",
+        "Requests rejected with 503 by route class and reason: queue_full or timeout",
+        ("route_class", "reason"),
+    )
+)
+STARTUP_DURATION = registry.register(
+    Gauge(
+        "app_startup_duration_seconds",
+        "Time spent starting the worker by phase, total is the time to ready",
+        ("phase",),
+    )
+)
+registry.register(DBPoolMetrics())
+
+
+@contextmanager
+def measure(histogram: Histogram, *labelvalues) -> Iterator[None]:
+    """Observe time spent in the block in the histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, *labelvalues)
+
+
+def timed(histogram: Histogram, *labelvalues) -> Callable:
+    """Observe time spent in the decorated coroutine function in the histogram"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with measure(histogram, *labelvalues):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,50 +1,239 @@
 import asyncio
 import logging
-from typing import Optional
+from typing import List, Optional
 
+import orjson
+from aioredis.exceptions import RedisError
 from pydantic.types import PositiveInt
 
+from config import config
 from models.services.user import UserDBService
 from models.user import User
-from services.caching import CachingService
+from services.caching import CachingService, HitCounter, SingleFlight
 from services.hashing import HasherService
-from utils.errors import UserDoesNotExistError
+from services.user_filter import user_filter
+from utils.errors import UserAlreadyExistError, UserDoesNotExistError
+
+logger = logging.getLogger(__name__)
+
+# concurrent cache misses of the same user wait for one database query
+user_loads = SingleFlight()
+# reads of users, the most read ones are loaded into the cache by warm-up
+user_hits = HitCounter("Users:hot", config.HOT_USERS_SIZE, config.HOT_USERS_TTL)
+
+
+def user_cache_key(user_id: PositiveInt) -> str:
+    """Key of the canonical cached record of the user"""
+    return f"Users:{user_id}"
+
+
+def login_cache_key(login: str) -> str:
+    """Key of the login -> user id alias of the cached user record"""
+    return f"Users:login:{login}"
 
 
 class UserService:
     @staticmethod
     async def create_user(login: str, password: str) -> User:
-        hashed_password = HasherService.get_password_hash(password)
-        user = UserDBService.create_user(login, hashed_password)
+        # a query is cheaper than hashing the password of a taken login
+        if user_filter.is_login_likely_taken(login):
+            taken = await UserDBService.get_user(login=login) is not None
+            user_filter.observe_login_check(taken)
+            if taken:
+                raise UserAlreadyExistError
+        hashed_password = await HasherService.hash_password(password)
+        user = await UserDBService.create_user(login, hashed_password)
+        user_filter.add(user.id, login)
+        # the user could have been looked up before it existed. The user is
+        # already created, so a cache failure doesn't fail the request, the
+        # tombstones expire within CACHE_TOMBSTONE_TTL anyway
+        try:
+            await CachingService.delete_tombstones(
+                [user_cache_key(user.id), login_cache_key(login)]
+            )
+        except RedisError:
+            logger.warning("failed to delete tombstones of created user", exc_info=True)
         return user
 
     @staticmethod
     async def get_user(
         user_id: Optional[PositiveInt] = None, login: Optional[str] = None
     ) -> User:
-        user = await CachingService.get_value(f"Users:{user_id}-{login}")
+        if user_id and user_filter.is_missing_id(user_id):
+            raise UserDoesNotExistError
+        user = await UserService._get_cached_user(user_id, login)
         if user:
-            user = User(**user)
-            logging.warning("cache hit")
-        else:
-            user = UserDBService.get_user(user_id, login)
-            logging.warning("cache miss")
+            logger.info("cache hit", extra={"user_id": user_id, "login": login})
+            user_hits.record(user.id)
+            return user
+
+        logger.info("cache miss", extra={"user_id": user_id, "login": login})
+        user = await user_loads.do(
+            (user_id, login), lambda: UserService._load_user(user_id, login)
+        )
         if not user:
             raise UserDoesNotExistError
-        await CachingService.set_value(f"Users:{user_id}-{login}", user.dict())
+        user_hits.record(user.id)
         return user
 
+    @staticmethod
+    async def get_user_json(user_id: PositiveInt) -> bytes:
+        """Get user rendered as JSON, the fast path of `get_user` for API.
+
+        Cached users are returned as stored. Users loaded from database are
+        validated `User` models, so the cache only ever holds valid users.
+        """
+        if user_filter.is_missing_id(user_id):
+            raise UserDoesNotExistError
+        user = await CachingService.get_json(user_cache_key(user_id))
+        if user:
+            logger.info("cache hit", extra={"user_id": user_id})
+            user_hits.record(user_id)
+            return user
+
+        logger.info("cache miss", extra={"user_id": user_id})
+        user = await user_loads.do(
+            (user_id, None), lambda: UserService._load_user(user_id)
+        )
+        if not user:
+            raise UserDoesNotExistError
+        user_hits.record(user_id)
+        return orjson.dumps(user.dict())
+
+    @staticmethod
+    async def get_users(user_ids: List[PositiveInt]) -> List[Optional[User]]:
+        """Get users in the order of ids, `None` in place of missing users.
+
+        Cached users are read in one round trip, the rest are loaded with one
+        database query and put into the cache in one round trip.
+        """
+        unique_ids = [
+            user_id
+            for user_id in dict.fromkeys(user_ids)
+            if not user_filter.is_missing_id(user_id)
+        ]
+        cached_users = await CachingService.get_many(
+            [user_cache_key(user_id) for user_id in unique_ids]
+        )
+        users = {
+            user_id: User(**user)
+            for user_id, user in zip(unique_ids, cached_users)
+            if user
+        }
+        missing_ids = [user_id for user_id in unique_ids if user_id not in users]
+        if missing_ids:
+            tombstones = await CachingService.get_tombstones(
+                [user_cache_key(user_id) for user_id in missing_ids]
+            )
+            missing_ids = [
+                user_id
+                for user_id, tombstone in zip(missing_ids, tombstones)
+                if not tombstone
+            ]
+        if missing_ids:
+            loaded_users = await UserDBService.get_users(missing_ids)
+            if len(loaded_users) < len(missing_ids):
+                # users created on another worker may not have reached the
+                # replica yet, they are only tombstoned when the primary
+                # misses them too
+                loaded_ids = {user.id for user in loaded_users}
+                loaded_users += await UserDBService.get_users(
+                    [user_id for user_id in missing_ids if user_id not in loaded_ids],
+                    primary=True,
+                )
+            await CachingService.set_many(
+                {user_cache_key(user.id): user.dict() for user in loaded_users}
+            )
+            users.update((user.id, user) for user in loaded_users)
+            await CachingService.set_tombstones(
+                [
+                    user_cache_key(user_id)
+                    for user_id in missing_ids
+                    if user_id not in users
+                ]
+            )
+        return [users.get(user_id) for user_id in user_ids]
+
     @staticmethod
     async def update_user(
         user_id: PositiveInt, password: Optional[str] = None, name: Optional[str] = None
     ) -> User:
-        user = UserDBService.get_user(user_id)
-        if not user:
+        if password:
+            password = await HasherService.hash_password(password)
+        updated_user = await UserDBService.update_user(user_id, password, name)
+        if not updated_user:
             raise UserDoesNotExistError
-        updated_user = UserDBService.update_user(user, password, name)
-        await asyncio.gather(
-            CachingService.delete_key(f"Users:{updated_user.id}-{updated_user.login}"),
-            CachingService.delete_key(f"Users:{updated_user.id}-None"),
-            CachingService.delete_key(f"Users:None-{updated_user.login}"),
+        # login can't be changed, so the login alias stays valid. The updated
+        # user is cached rather than the key deleted: other workers don't know
+        # about the write, and would cache the old user read from a lagging
+        # replica on the next miss
+        await CachingService.replace_value(
+            user_cache_key(updated_user.id), updated_user.dict()
         )
         return updated_user
+
+    @staticmethod
+    async def _get_cached_user(
+        user_id: Optional[PositiveInt] = None, login: Optional[str] = None
+    ) -> Optional[User]:
+        if not user_id and login:
+            user_id = await CachingService.get_value(login_cache_key(login))
+        if not user_id:
+            return None
+        user = await CachingService.get_value(user_cache_key(user_id))
+        if user and (not login or user["login"] == login):
+            return User(**user)
+
+    @staticmethod
+    async def _load_user(
+        user_id: Optional[PositiveInt] = None, login: Optional[str] = None
+    ) -> Optional[User]:
+        """Load user from database into the cache.
+
+        Users known to be missing are not looked up until their tombstone
+        expires. A tombstone is written only when the primary misses the
+        user too, a replica may lag behind a user created on another worker.
+        With `CACHE_LOCK_ENABLED` only the worker holding the lock queries the
+        database, the others wait for the user to appear in the cache and
+        query the database themselves only if it doesn't in time.
+        """
+        lock_key = user_cache_key(user_id) if user_id else login_cache_key(login)
+        # a miss by both id and login doesn't tell which of them is missing
+        tombstone_key = None if user_id and login else lock_key
+        if tombstone_key and (await CachingService.get_tombstones([tombstone_key]))[0]:
+            return None
+
+        token = None
+        if config.CACHE_LOCK_ENABLED:
+            token = await CachingService.acquire_lock(lock_key)
+            if not token:
+                user = await UserService._wait_for_cached_user(user_id, login)
+                if user:
+                    return user
+
+        try:
+            user = await UserDBService.get_user(user_id, login)
+            if not user and tombstone_key:
+                user = await UserDBService.get_user(user_id, login, primary=True)
+            if user:
+                await CachingService.set_value(user_cache_key(user.id), user.dict())
+                if login:
+                    await CachingService.set_value(login_cache_key(login), user.id)
+            elif tombstone_key:
+                await CachingService.set_tombstones([tombstone_key])
+            return user
+        finally:
+            if token:
+                await CachingService.release_lock(lock_key, token)
+
+    @staticmethod
+    async def _wait_for_cached_user(
+        user_id: Optional[PositiveInt] = None, login: Optional[str] = None
+    ) -> Optional[User]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.CACHE_LOCK_TIMEOUT
+        while loop.time() < deadline:
+            await asyncio.sleep(config.CACHE_LOCK_POLL_INTERVAL)
+            user = await UserService._get_cached_user(user_id, login)
+            if user:
+                return user
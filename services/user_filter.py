@@ -0,0 +1,120 @@
+import logging
+from typing import Dict, Optional, Union
+
+from pydantic.types import PositiveInt
+
+from config import config
+from models.services.user import UserDBService
+from utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+
+class UserFilter:
+    """Filters of ids and logins of existing users, in the memory of a worker.
+
+    Users created by other workers are not added, so only answers which
+    stay true regardless are given: an id well below the highest id seen by
+    the scan which isn't in the filter doesn't exist (users are never
+    deleted), and a login in the filter is likely taken. Until the filters
+    are built every id may exist and no login is likely taken.
+
+    The scan reads the primary, a lagging replica could miss committed
+    users. Ids within USER_FILTER_ID_MARGIN of the highest scanned id may
+    belong to transactions which took them from the sequence before the
+    scan and committed after it, so they are never reported missing.
+    """
+
+    def __init__(self):
+        self.ids: Optional[BloomFilter] = None
+        self.logins: Optional[BloomFilter] = None
+        self.max_scanned_id = 0
+        self.missing_ids = 0
+        self.created_users = 0
+        self.login_checks = 0
+        self.login_false_positives = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.ids is not None
+
+    async def build(self) -> None:
+        """Fill new filters by scanning the users table, then start using them"""
+        capacity = max(
+            config.USER_FILTER_CAPACITY,
+            2 * await UserDBService.count_users(primary=True),
+        )
+        ids = BloomFilter(capacity, config.USER_FILTER_ERROR_RATE)
+        logins = BloomFilter(capacity, config.USER_FILTER_ERROR_RATE)
+        max_scanned_id = 0
+        async for user_id, login in UserDBService.stream_user_keys(primary=True):
+            ids.add(user_id)
+            logins.add(login)
+            max_scanned_id = max(max_scanned_id, user_id)
+        self.ids, self.logins, self.max_scanned_id = ids, logins, max_scanned_id
+        logger.info("user filter is built", extra=self.get_stats())
+
+    async def build_or_skip(self) -> None:
+        """Build the filters, a failure leaves the filters unused"""
+        try:
+            await self.build()
+        except Exception:
+            logger.warning("failed to build user filter", exc_info=True)
+
+    def clear(self) -> None:
+        """Stop using the filters until they are built again"""
+        self.__init__()
+
+    def add(self, user_id: PositiveInt, login: str) -> None:
+        """Add user created by this worker"""
+        if self.ready:
+            self.ids.add(user_id)
+            self.logins.add(login)
+            self.created_users += 1
+
+    def is_missing_id(self, user_id: PositiveInt) -> bool:
+        """Whether the user surely doesn't exist"""
+        if (
+            not self.ready
+            or user_id > self.max_scanned_id - config.USER_FILTER_ID_MARGIN
+            or user_id in self.ids
+        ):
+            return False
+        self.missing_ids += 1
+        return True
+
+    def is_login_likely_taken(self, login: str) -> bool:
+        """Whether the login is worth checking in the database"""
+        return self.ready and login in self.logins
+
+    def observe_login_check(self, taken: bool) -> None:
+        self.login_checks += 1
+        if not taken:
+            self.login_false_positives += 1
+
+    def get_stats(self) -> Dict[str, Union[bool, int, float]]:
+        stats = {"ready": self.ready}
+        if not self.ready:
+            return stats
+        return {
+            **stats,
+            "memory_bytes": self.ids.memory_bytes + self.logins.memory_bytes,
+            "users": self.ids.count,
+            "capacity": self.ids.capacity,
+            "max_scanned_id": self.max_scanned_id,
+            "id_margin": config.USER_FILTER_ID_MARGIN,
+            "target_false_positive_rate": self.ids.error_rate,
+            "expected_false_positive_rate": round(self.ids.false_positive_rate, 6),
+            # share of logins of users created by this worker, which were
+            # found in the filter while free
+            "observed_false_positive_rate": round(
+                self.login_false_positives / self.created_users, 6
+            )
+            if self.created_users
+            else 0.0,
+            "login_checks": self.login_checks,
+            "missing_ids": self.missing_ids,
+        }
+
+
+user_filter = UserFilter()
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import List
+
+from pydantic.types import PositiveInt
+
+from config import config
+from models.services.user import UserDBService
+from models.user import USERS_BATCH_SIZE
+from services.caching import CachingService
+from services.user import UserService, user_hits
+
+logger = logging.getLogger(__name__)
+
+# set after a warm-up, workers starting while it is kept don't repeat it
+WARMUP_DONE_KEY = "Warmup:done"
+
+
+class WarmupService:
+    @staticmethod
+    async def get_user_ids(source: str, limit: int) -> List[PositiveInt]:
+        """Ids of users to warm up: most read ("hot") or newest ("recent")"""
+        if source == "hot":
+            members = await CachingService.get_top_members(user_hits.key, limit)
+            return [int(member) for member in members]
+        if source == "recent":
+            return await UserDBService.get_recent_user_ids(limit)
+        raise ValueError(f"unknown warm-up source {source}")
+
+    @staticmethod
+    async def warm_up_users(
+        user_ids: List[PositiveInt], rate: int = config.WARMUP_RATE
+    ) -> int:
+        """Load users missing in the cache, at most `rate` users per second.
+
+        Users are loaded batch by batch, so warm-up holds one database
+        connection at a time. Return number of found users.
+        """
+        batch_size = min(USERS_BATCH_SIZE, rate)
+        loop = asyncio.get_running_loop()
+        found = 0
+        for start in range(0, len(user_ids), batch_size):
+            started = loop.time()
+            batch = user_ids[start : start + batch_size]
+            users = await UserService.get_users(batch)
+            found += sum(user is not None for user in users)
+            await asyncio.sleep(len(batch) / rate - (loop.time() - started))
+        return found
+
+    @staticmethod
+    async def warm_up(
+        source: str = config.WARMUP_SOURCE,
+        limit: int = config.WARMUP_USERS,
+        rate: int = config.WARMUP_RATE,
+    ) -> int:
+        user_ids = await WarmupService.get_user_ids(source, limit)
+        found = await WarmupService.warm_up_users(user_ids, rate)
+        logger.info("cache is warmed up", extra={"source": source, "users": found})
+        return found
+
+    @staticmethod
+    def get_lock_timeout() -> float:
+        """Seconds the warm-up lock is held for at most"""
+        return config.WARMUP_USERS / config.WARMUP_RATE + config.WARMUP_LOCK_MARGIN
+
+    @staticmethod
+    async def warm_up_once_per_deploy() -> None:
+        """Warm up in the worker which takes the lock, skip in the others.
+
+        Workers starting within WARMUP_REPEAT_INTERVAL of a finished warm-up
+        skip it too, a failed warm-up is left to the next starting worker.
+        """
+        try:
+            if await CachingService.get_value(WARMUP_DONE_KEY):
+                return
+            token = await CachingService.acquire_lock(
+                "warmup", WarmupService.get_lock_timeout()
+            )
+            if not token:
+                return
+            try:
+                # another worker could have finished before the lock was taken
+                if not await CachingService.get_value(WARMUP_DONE_KEY):
+                    await WarmupService.warm_up()
+                    await CachingService.set_value(
+                        WARMUP_DONE_KEY, 1, config.WARMUP_REPEAT_INTERVAL
+                    )
+            finally:
+                await CachingService.release_lock("warmup", token)
+        except Exception:
+            logger.warning("cache warm-up failed", exc_info=True)
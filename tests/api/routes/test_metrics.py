@@ -0,0 +1,61 @@
+from unittest.mock import Mock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+metrics_url = "/metrics"
+
+
+class TestDBPoolMetrics:
+    @pytest.mark.asyncio()
+    @patch("api.routes.metrics.get_pool_stats")
+    async def test_get_db_pool_metrics_successfully(
+        self, get_pool_stats_mock: Mock, client: TestClient
+    ):
+        get_pool_stats_mock.return_value = {"size": 3, "checked_out": 1}
+
+        result = client.get(f"{metrics_url}/db_pool")
+        assert result.status_code == 200
+        assert result.json() == {"size": 3, "checked_out": 1}
+
+
+class TestUserFilterMetrics:
+    @pytest.mark.asyncio()
+    async def test_get_user_filter_metrics_not_built(self, client: TestClient):
+        result = client.get(f"{metrics_url}/user_filter")
+        assert result.status_code == 200
+        assert result.json() == {"ready": False}
+
+
+class TestPrometheusMetrics:
+    @pytest.mark.asyncio()
+    @patch("services.metrics.get_pool_stats")
+    async def test_get_metrics_observes_route_latency(
+        self, get_pool_stats_mock: Mock, client: TestClient
+    ):
+        get_pool_stats_mock.return_value = {}
+
+        client.get(f"{metrics_url}/db_pool")
+        result = client.get(metrics_url)
+
+        assert result.status_code == 200
+        assert (
+            result.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+        )
+        assert (
+            "http_request_duration_seconds_count"
+            '{method="GET",route="/metrics/db_pool",status="200"}'
+        ) in result.text
+
+    @pytest.mark.asyncio()
+    @patch("services.metrics.get_pool_stats")
+    async def test_get_metrics_hides_unmatched_paths(
+        self, get_pool_stats_mock: Mock, client: TestClient
+    ):
+        get_pool_stats_mock.return_value = {}
+
+        client.get("/unknown/path")
+        result = client.get(metrics_url)
+
+        assert 'route="unmatched",status="404"' in result.text
+        assert "/unknown/path" not in result.text
@@ -1,5 +1,6 @@
 from unittest.mock import AsyncMock, Mock, patch
 
+import orjson
 import pytest
 from fastapi.testclient import TestClient
 
@@ -7,6 +8,7 @@ from models.user import User
 from utils.errors import UserAlreadyExistError, UserDoesNotExistError
 
 get_user_url = "/get_user"
+get_users_url = "/users"
 create_user_url = "/create_user"
 update_user_url = "/update_user"
 user_service_path = "api.routes.user.UserService"
@@ -14,14 +16,15 @@ user_service_path = "api.routes.user.UserService"
 
 class TestGetUser:
     @pytest.mark.asyncio()
-    @patch(f"{user_service_path}.get_user")
+    @patch(f"{user_service_path}.get_user_json")
     async def test_get_user_successfully(
         self, get_user_mock: AsyncMock, client: TestClient, user_db_fixture: User
     ):
-        get_user_mock.return_value = user_db_fixture
+        get_user_mock.return_value = orjson.dumps(user_db_fixture.dict())
 
         result = client.get(f"{get_user_url}/1")
         assert result.status_code == 200
+        assert result.headers["content-type"] == "application/json"
         assert result.json() == {
             "id": 1,
             "login": "test_user",
@@ -32,7 +35,7 @@ class TestGetUser:
         get_user_mock.assert_awaited_with(1)
 
     @pytest.mark.asyncio()
-    @patch(f"{user_service_path}.get_user")
+    @patch(f"{user_service_path}.get_user_json")
     async def test_get_user_does_not_exist_error(
         self, get_user_mock: AsyncMock, client: TestClient, user_db_fixture: User
     ):
@@ -69,6 +72,67 @@ class TestGetUser:
         assert result.json() == {"detail": "Not Found"}
 
 
+class TestGetUsers:
+    @pytest.mark.asyncio()
+    @patch(f"{user_service_path}.get_users")
+    async def test_get_users_successfully(
+        self, get_users_mock: AsyncMock, client: TestClient, user_db_fixture: User
+    ):
+        get_users_mock.return_value = [None, user_db_fixture]
+
+        result = client.get(f"{get_users_url}?ids=2&ids=1")
+        assert result.status_code == 200
+        assert result.json() == [
+            {"id": 2, "found": False, "user": None},
+            {
+                "id": 1,
+                "found": True,
+                "user": {
+                    "id": 1,
+                    "login": "test_user",
+                    "name": None,
+                    "password": "$2b$12$O3MYXaKY5uw6TJ9PSQDI5uCMh3bj8ZQjpAUtkhinrRDiOQhSkuUEi",
+                },
+            },
+        ]
+
+        get_users_mock.assert_awaited_with([2, 1])
+
+    @pytest.mark.asyncio()
+    @patch(f"{user_service_path}.get_users")
+    async def test_get_users_by_body_successfully(
+        self, get_users_mock: AsyncMock, client: TestClient, user_db_fixture: User
+    ):
+        get_users_mock.return_value = [user_db_fixture]
+
+        result = client.post(f"{get_users_url}", json={"ids": [1]})
+        assert result.status_code == 200
+        assert result.json()[0]["found"] is True
+
+        get_users_mock.assert_awaited_with([1])
+
+    @pytest.mark.asyncio()
+    async def test_get_users_too_many_ids(self, client: TestClient):
+        ids = "&".join(f"ids={i}" for i in range(1, 102))
+
+        result = client.get(f"{get_users_url}?{ids}")
+        assert result.status_code == 422
+
+        body_result = client.post(f"{get_users_url}", json={"ids": list(range(1, 102))})
+        assert body_result.status_code == 422
+        # the same request validation error, only the location of ids differs
+        error = result.json()["detail"][0]
+        body_error = body_result.json()["detail"][0]
+        assert error["loc"] == ["query", "ids"]
+        assert body_error["loc"] == ["body", "ids"]
+        assert {**error, "loc": None} == {**body_error, "loc": None}
+
+    @pytest.mark.asyncio()
+    async def test_get_users_skip_required_param(self, client: TestClient):
+        result = client.get(f"{get_users_url}")
+        assert result.status_code == 422
+
+
 class TestCreateUser:
     @pytest.mark.asyncio()
     @patch("api.routes.user.create_access_token")
@@ -0,0 +1,27 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+from aioredis.exceptions import ConnectionError
+from fastapi.testclient import TestClient
+
+from services.metrics import STARTUP_DURATION
+
+
+class TestStartup:
+    @patch("api.init_api.CachingService.listen_invalidations", new_callable=AsyncMock)
+    @patch("api.init_api.prewarm_redis_pool", new_callable=AsyncMock)
+    @patch("api.init_api.database.prewarm_database_pool", new_callable=AsyncMock)
+    def test_startup_survives_failed_prewarm(
+        self,
+        prewarm_database_mock: AsyncMock,
+        prewarm_redis_mock: AsyncMock,
+        listen_mock: AsyncMock,
+        client: TestClient,
+    ):
+        prewarm_database_mock.return_value = 3
+        prewarm_redis_mock.side_effect = ConnectionError
+
+        with client:
+            prewarm_database_mock.assert_awaited_once_with(3)
+            prewarm_redis_mock.assert_awaited_once_with(5)
+            assert STARTUP_DURATION.values[("total",)] > 0
+            assert ("redis",) in STARTUP_DURATION.values
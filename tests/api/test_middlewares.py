@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from api.middlewares import ConcurrencyLimiter, LoadSheddingMiddleware, get_route_class
+from services.metrics import LOAD_SHEDDING_QUEUE_DEPTH, LOAD_SHEDDING_REJECTED
+
+
+class TestGetRouteClass:
+    @pytest.mark.parametrize(
+        "method, path, route_class",
+        [
+            ("GET", "/get_user/1", "read"),
+            ("POST", "/users", "read"),
+            ("PATCH", "/update_user/", "write"),
+            ("POST", "/create_user/", "signup"),
+            ("GET", "/metrics", None),
+        ],
+    )
+    def test_get_route_class(self, method: str, path: str, route_class: str):
+        assert get_route_class(method, path) == route_class
+
+
+class TestConcurrencyLimiter:
+    @pytest.mark.asyncio()
+    async def test_waiting_requests_are_admitted_by_priority(self):
+        limiter = ConcurrencyLimiter(1, {}, queue_size=10)
+        assert await limiter.acquire("write", 1) is None
+
+        admitted = []
+
+        async def request(route_class: str) -> None:
+            assert await limiter.acquire(route_class, 1) is None
+            admitted.append(route_class)
+            limiter.release(route_class)
+
+        waiting = [
+            asyncio.create_task(request(route_class))
+            for route_class in ("signup", "write", "read")
+        ]
+        await asyncio.sleep(0)
+        assert LOAD_SHEDDING_QUEUE_DEPTH.values[("read",)] == 1
+
+        limiter.release("write")
+        await asyncio.gather(*waiting)
+
+        assert admitted == ["read", "write", "signup"]
+        assert sum(limiter.in_flight.values()) == 0
+        assert LOAD_SHEDDING_QUEUE_DEPTH.values[("read",)] == 0
+
+    @pytest.mark.asyncio()
+    async def test_class_limit_doesnt_block_other_classes(self):
+        limiter = ConcurrencyLimiter(2, {"signup": 1}, queue_size=10)
+        assert await limiter.acquire("signup", 1) is None
+
+        assert await limiter.acquire("signup", 0.01) == "timeout"
+        assert await limiter.acquire("read", 0.01) is None
+
+    @pytest.mark.asyncio()
+    async def test_full_queue_rejects_at_once(self):
+        limiter = ConcurrencyLimiter(1, {}, queue_size=1)
+        assert await limiter.acquire("read", 1) is None
+        waiting = asyncio.create_task(limiter.acquire("read", 1))
+        await asyncio.sleep(0)
+
+        assert await limiter.acquire("read", 1) == "queue_full"
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert not limiter._waiters
+
+
+class TestLoadSheddingMiddleware:
+    def test_rejected_request_gets_retry_after(self):
+        async def slow(request):
+            await asyncio.sleep(0.2)
+            return PlainTextResponse("ok")
+
+        app = Starlette(routes=[Route("/create_user/", slow, methods=["POST"])])
+        limiter = ConcurrencyLimiter(10, {"signup": 1}, queue_size=10)
+        app.add_middleware(
+            LoadSheddingMiddleware, limiter=limiter, queue_timeout=0.05, retry_after=2
+        )
+        rejected_before = LOAD_SHEDDING_REJECTED.values.get(("signup", "timeout"), 0)
+
+        async def send_requests():
+            # the test client runs the app in its own thread
+            loop = asyncio.get_running_loop()
+            with TestClient(app) as client:
+                return await asyncio.gather(
+                    *(
+                        loop.run_in_executor(None, client.post, "/create_user/")
+                        for _ in range(2)
+                    )
+                )
+
+        responses = asyncio.run(send_requests())
+
+        statuses = sorted(response.status_code for response in responses)
+        assert statuses == [200, 503]
+        rejected = next(r for r in responses if r.status_code == 503)
+        assert rejected.headers["Retry-After"] == "2"
+        assert rejected.json() == {"detail": "server is busy, please, try again later"}
+        assert (
+            LOAD_SHEDDING_REJECTED.values[("signup", "timeout")] == rejected_before + 1
+        )
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from api.migrate import migrate
+
+
+class TestMigrate:
+    @pytest.mark.asyncio()
+    async def test_migrate_creates_tables(self, tmp_path: Path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/empty.sqlite")
+
+        with patch("api.migrate.engine", engine):
+            await migrate()
+
+        async with engine.connect() as connection:
+            tables = await connection.run_sync(
+                lambda sync_connection: inspect(sync_connection).get_table_names()
+            )
+        assert "user" in tables
+        await engine.dispose()
+
+    def test_migrate_module_registers_tables(self):
+        # a fresh interpreter, the tests have imported all models already
+        code = (
+            "import api.migrate; from sqlmodel import SQLModel; "
+            "print(sorted(SQLModel.metadata.tables))"
+        )
+        output = subprocess.check_output(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).parent.parent.parent,
+            text=True,
+        )
+        assert output.strip() == "['user']"
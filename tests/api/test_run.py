@@ -0,0 +1,70 @@
+from types import ModuleType
+from unittest.mock import Mock, patch
+
+import pytest
+from gunicorn.app.base import BaseApplication
+
+from config import Config
+
+
+@pytest.fixture()
+def run_module() -> ModuleType:
+    # the module sets up logging of the process on import
+    with patch("utils.logging.setup_logging"):
+        import api.run
+
+    return api.run
+
+
+class TestRunUvicorn:
+    @patch("uvicorn.run")
+    def test_run_uvicorn(self, run_mock: Mock, run_module: ModuleType, config: Config):
+        run_module.run_uvicorn(config)
+
+        run_mock.assert_called_once()
+        options = run_mock.call_args.kwargs
+        assert options["loop"] == "uvloop"
+        assert options["http"] == "httptools"
+        assert options["backlog"] == 2048
+        assert options["timeout_keep_alive"] == 75
+        assert options["debug"] is False
+
+
+class TestRunGunicorn:
+    @patch.object(BaseApplication, "run", autospec=True)
+    def test_run_gunicorn_preloads_app(
+        self, run_mock: Mock, run_module: ModuleType, config: Config
+    ):
+        config = config.copy(update={"WORKERS": 4, "SERVER_MAX_REQUESTS": 1000})
+        run_module.run_gunicorn(config, "127.0.0.1:8001")
+
+        application = run_mock.call_args.args[0]
+        cfg = application.cfg
+        assert cfg.bind == ["127.0.0.1:8001"]
+        assert cfg.workers == 4
+        assert cfg.preload_app is True
+        assert cfg.max_requests == 1000
+        # gunicorn takes the worker class by its dotted path only
+        assert cfg.worker_class_str == "api.run.GunicornWorker"
+        assert cfg.worker_class is run_module.GunicornWorker
+        assert cfg.worker_class.CONFIG_KWARGS["loop"] == "uvloop"
+        assert cfg.worker_class.CONFIG_KWARGS["http"] == "httptools"
+        assert application.load() is run_module.app
+
+    @patch.object(BaseApplication, "run", autospec=True)
+    @patch("api.run.init_api")
+    def test_run_gunicorn_without_preload(
+        self,
+        init_api_mock: Mock,
+        run_mock: Mock,
+        run_module: ModuleType,
+        config: Config,
+    ):
+        config = config.copy(update={"SERVER_PRELOAD": False})
+        run_module.run_gunicorn(config)
+
+        application = run_mock.call_args.args[0]
+        assert application.cfg.preload_app is False
+        # every worker builds its own app
+        assert application.load() is init_api_mock.return_value
+        init_api_mock.assert_called_once_with(config)
@@ -1,16 +1,21 @@
 from pathlib import Path
 
 import pytest  # noqa
+import pytest_asyncio
 from aioredis import Redis
 from fastapi.testclient import TestClient
-from sqlalchemy.future import Engine
-from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from api.init_api import FastAPI, init_api
-from clients.database import get_session
+from clients.database import get_async_database_url, get_session
 from config import Config
 from models.user import User
+from services.caching import local_cache
+from services.user_filter import user_filter
 from tests.fixtures import *  # noqa
+from utils.jwt import verified_tokens
 
 PROJECT_ROOT_PATH = Path(__file__).parent.parent
 
@@ -34,29 +39,52 @@ def client(app: FastAPI) -> TestClient:
     yield TestClient(app)
 
 
-@pytest.fixture(scope="session")
-def db_engine(config: Config) -> Engine:
-    engine = create_engine(config.DATABASE_URL)
+@pytest_asyncio.fixture()
+async def db_engine(config: Config) -> AsyncEngine:
+    engine = create_async_engine(get_async_database_url(config.DATABASE_URL))
     # create database and table
-    SQLModel.metadata.create_all(engine)
-    return engine
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    yield engine
+    await engine.dispose()
 
 
-@pytest.fixture()
-def db_session(db_engine: Engine) -> Session:
-    with get_session(db_engine) as session:
+@pytest_asyncio.fixture()
+async def db_session(db_engine: AsyncEngine) -> AsyncSession:
+    async with get_session(db_engine) as session:
         yield session
 
 
-@pytest.fixture()
-def clear_db(db_session: Session) -> None:
-    db_session.execute(User.__table__.delete())
-    db_session.commit()
+@pytest_asyncio.fixture()
+async def clear_db(db_session: AsyncSession) -> None:
+    await db_session.execute(User.__table__.delete())
+    await db_session.commit()
     yield
-    db_session.execute(User.__table__.delete())
-    db_session.commit()
+    await db_session.execute(User.__table__.delete())
+    await db_session.commit()
 
 
 @pytest.fixture()
 def redis_client(config: Config) -> Redis:
     return Redis.from_url(config.REDIS_URL, encoding="utf-8", decode_responses=True)
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache() -> None:
+    local_cache.clear()
+    yield
+    local_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_verified_tokens() -> None:
+    verified_tokens.clear()
+    yield
+    verified_tokens.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_user_filter() -> None:
+    user_filter.clear()
+    yield
+    user_filter.clear()
@@ -0,0 +1,203 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, text
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from clients.database import (
+    InstrumentedPool,
+    RecentWrites,
+    ReplicaSet,
+    get_pool_stats,
+    get_read_session,
+    prewarm_database_pool,
+)
+from config import Config
+
+
+class TestInstrumentedPool:
+    @pytest.mark.asyncio()
+    async def test_pool_stats_record_checkouts_and_timeouts(self, config: Config):
+        engine = create_async_engine(
+            "sqlite+aiosqlite:///:memory:",
+            poolclass=InstrumentedPool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.01,
+        )
+        async with engine.connect():
+            assert get_pool_stats(engine)["checked_out"] == 1
+
+            with pytest.raises(TimeoutError):
+                async with engine.connect():
+                    pass
+
+        stats = get_pool_stats(engine)
+        assert stats["size"] == 1
+        assert stats["checked_out"] == 0
+        assert stats["checkouts"] == 2
+        assert stats["timeouts"] == 1
+        assert stats["wait_time_buckets"][-1] == ["+Inf", 2]
+        assert stats["wait_time_sum"] >= 0.01
+
+        await engine.dispose()
+        assert get_pool_stats(engine)["checkouts"] == 2
+
+    @pytest.mark.asyncio()
+    async def test_pool_stats_record_connects_apart_from_wait(self):
+        engine = create_async_engine(
+            "sqlite+aiosqlite:///:memory:",
+            poolclass=InstrumentedPool,
+            pool_size=1,
+            max_overflow=0,
+        )
+        # opening a connection takes 50ms
+        event.listen(engine.sync_engine, "connect", lambda *args: time.sleep(0.05))
+
+        async with engine.connect():
+            pass
+        async with engine.connect():
+            pass
+
+        stats = get_pool_stats(engine)
+        assert stats["checkouts"] == 2
+        assert stats["connects"] == 1
+        assert stats["connect_time_sum"] >= 0.05
+        assert stats["wait_time_sum"] < 0.05
+        await engine.dispose()
+
+    @pytest.mark.asyncio()
+    async def test_pool_stats_of_engine_without_pool(self, db_engine):
+        assert get_pool_stats(db_engine) == {}
+
+
+class TestPrewarmDatabasePool:
+    @pytest.mark.asyncio()
+    async def test_prewarm_opens_up_to_pool_size(self):
+        engine = create_async_engine(
+            "sqlite+aiosqlite:///:memory:",
+            poolclass=InstrumentedPool,
+            pool_size=2,
+            max_overflow=1,
+        )
+
+        assert await prewarm_database_pool(5, engine) == 2
+
+        stats = get_pool_stats(engine)
+        assert stats["checked_in"] == 2
+        assert stats["checked_out"] == 0
+        await engine.dispose()
+
+    @pytest.mark.asyncio()
+    async def test_prewarm_engine_without_pool(self, db_engine):
+        assert await prewarm_database_pool(5, db_engine) == 0
+
+
+@pytest_asyncio.fixture()
+async def database_files(tmp_path: Path) -> List[AsyncEngine]:
+    """Primary and two replicas, every database file knows its name"""
+    engines = []
+    for name in ("primary", "replica_1", "replica_2"):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/{name}.sqlite")
+        async with engine.begin() as connection:
+            await connection.execute(text("CREATE TABLE node (name TEXT)"))
+            await connection.execute(text(f"INSERT INTO node VALUES ('{name}')"))
+        engines.append(engine)
+    yield engines
+    for engine in engines:
+        await engine.dispose()
+
+
+async def read_node(primary: bool = False) -> str:
+    async with get_read_session(primary) as session:
+        result = await session.execute(text("SELECT name FROM node"))
+        return result.scalar_one()
+
+
+class TestGetReadSession:
+    @pytest.mark.asyncio()
+    async def test_round_robin(self, database_files: List[AsyncEngine]):
+        primary, *engines = database_files
+        with patch("clients.database.engine", primary), patch(
+            "clients.database.replicas", ReplicaSet(engines)
+        ):
+            nodes = [await read_node() for _ in range(4)]
+            assert nodes == ["replica_1", "replica_2", "replica_1", "replica_2"]
+            assert await read_node(primary=True) == "primary"
+
+    @pytest.mark.asyncio()
+    async def test_least_busy(self, database_files: List[AsyncEngine]):
+        primary, *engines = database_files
+        replicas = ReplicaSet(engines, "least_busy")
+        with patch("clients.database.engine", primary), patch(
+            "clients.database.replicas", replicas
+        ):
+            async with get_read_session():
+                assert replicas.sessions == {engines[0]: 1, engines[1]: 0}
+                assert await read_node() == "replica_2"
+            assert replicas.sessions == {engines[0]: 0, engines[1]: 0}
+
+    @pytest.mark.asyncio()
+    async def test_failover_to_primary(
+        self, database_files: List[AsyncEngine], tmp_path: Path
+    ):
+        primary, replica, _ = database_files
+        unavailable = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path}/missing/replica.sqlite"
+        )
+        replicas = ReplicaSet([unavailable, replica], retry_interval=60)
+        with patch("clients.database.engine", primary), patch(
+            "clients.database.replicas", replicas
+        ):
+            assert await read_node() == "primary"
+            # the failed replica is skipped until the retry interval passes
+            assert [await read_node() for _ in range(2)] == ["replica_1"] * 2
+
+    @pytest.mark.asyncio()
+    async def test_failover_to_primary_on_connect_timeout(
+        self, database_files: List[AsyncEngine]
+    ):
+        primary, replica, _ = database_files
+
+        def connect_timeout(*args):
+            raise asyncio.TimeoutError
+
+        # drop the pooled connection of the fixture
+        await replica.dispose()
+        event.listen(replica.sync_engine, "do_connect", connect_timeout)
+        replicas = ReplicaSet([replica], retry_interval=60)
+        with patch("clients.database.engine", primary), patch(
+            "clients.database.replicas", replicas
+        ):
+            assert await read_node() == "primary"
+            assert replicas.acquire() is None
+
+    @pytest.mark.asyncio()
+    async def test_without_replicas(self, database_files: List[AsyncEngine]):
+        with patch("clients.database.engine", database_files[0]), patch(
+            "clients.database.replicas", ReplicaSet([])
+        ):
+            assert await read_node() == "primary"
+
+
+class TestRecentWrites:
+    def test_written_keys_expire(self):
+        recent_writes = RecentWrites(ttl=10)
+        recent_writes.add(1)
+        recent_writes.add(("login", "test_login"))
+
+        assert 1 in recent_writes
+        assert ("login", "test_login") in recent_writes
+        assert 2 not in recent_writes
+
+        with patch("time.monotonic", return_value=time.monotonic() + 11):
+            assert 1 not in recent_writes
+            recent_writes.add(2)
+            # expired keys are dropped on writes
+            assert list(recent_writes._expires_at) == [2]
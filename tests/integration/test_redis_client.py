@@ -1,5 +1,24 @@
+from collections import Counter
+from typing import Dict
+from unittest.mock import AsyncMock, Mock, call, patch
+
+import orjson
 import pytest
 from aioredis import Redis
+from aioredis.exceptions import ConnectionError
+
+from benchmarks.memory_redis import MemoryRedis
+from clients.redis import (
+    HashRing,
+    ShardedRedis,
+    ShardsUnavailableError,
+    prewarm_redis_pool,
+)
+from models.user import User
+from services.caching import CachingService, decode_value, local_cache
+from services.user import UserService
+
+keys = [f"Users:{user_id}" for user_id in range(10000)]
 
 
 class TestRedisClient:
@@ -40,3 +59,177 @@ class TestRedisClient:
         result = await redis_client.get("test")
 
         assert result is None
+
+
+class TestPrewarmRedisPool:
+    @pytest.mark.asyncio()
+    async def test_prewarm_opens_up_to_max_connections(self):
+        client = Mock(connection_pool=Mock(max_connections=2))
+        client.connection_pool.get_connection = AsyncMock(side_effect=["a", "b"])
+        client.connection_pool.release = AsyncMock()
+
+        assert await prewarm_redis_pool(5, client) == 2
+
+        assert client.connection_pool.release.await_args_list == [call("a"), call("b")]
+
+    @pytest.mark.asyncio()
+    async def test_prewarm_releases_connections_on_error(self):
+        client = Mock(connection_pool=Mock(max_connections=2))
+        client.connection_pool.get_connection = AsyncMock(
+            side_effect=["a", ConnectionError]
+        )
+        client.connection_pool.release = AsyncMock()
+
+        with pytest.raises(ConnectionError):
+            await prewarm_redis_pool(2, client)
+
+        client.connection_pool.release.assert_awaited_once_with("a")
+
+
+@pytest.fixture()
+def nodes() -> Dict[str, MemoryRedis]:
+    return {f"redis://node_{number}": MemoryRedis() for number in range(3)}
+
+
+class TestHashRing:
+    def test_keys_are_spread_evenly(self):
+        ring = HashRing(["redis://a", "redis://b", "redis://c"])
+
+        counts = Counter(ring.get_node(key) for key in keys)
+        assert set(counts) == {"redis://a", "redis://b", "redis://c"}
+        for count in counts.values():
+            assert abs(count - len(keys) / 3) < len(keys) / 3 * 0.15
+
+    def test_added_node_moves_only_its_share_of_keys(self):
+        ring = HashRing(["redis://a", "redis://b", "redis://c"])
+        bigger_ring = HashRing(["redis://a", "redis://b", "redis://c", "redis://d"])
+
+        moved = [key for key in keys if ring.get_node(key) != bigger_ring.get_node(key)]
+        assert len(moved) < len(keys) * 0.35
+        assert {bigger_ring.get_node(key) for key in moved} == {"redis://d"}
+
+
+class TestShardedRedis:
+    @pytest.mark.asyncio()
+    async def test_keys_are_stored_on_their_nodes(self, nodes: Dict[str, MemoryRedis]):
+        redis = ShardedRedis(nodes)
+        async with redis.pipeline(transaction=False) as pipeline:
+            for key in keys[:100]:
+                pipeline.set(key, key)
+            await pipeline.execute()
+
+        assert await redis.mget(keys[:100]) == [key.encode() for key in keys[:100]]
+        assert await redis.get(keys[0]) == keys[0].encode()
+        for url, node in nodes.items():
+            assert node._data
+            assert all(redis.ring.get_node(key) == url for key in node._data)
+
+        async with redis.pipeline(transaction=False) as pipeline:
+            pipeline.delete(*keys[:50])
+            pipeline.publish("channel", "message")
+            await pipeline.execute()
+        assert await redis.mget(keys[:100]) == [None] * 50 + [
+            key.encode() for key in keys[50:100]
+        ]
+
+    @pytest.mark.asyncio()
+    async def test_failed_node_keeps_values_of_others(
+        self, nodes: Dict[str, MemoryRedis]
+    ):
+        redis = ShardedRedis(nodes)
+        for key in keys[:100]:
+            await redis.set(key, key)
+        failed_url = redis.ring.get_node(keys[0])
+        nodes[failed_url].mget = AsyncMock(side_effect=ConnectionError)
+
+        with pytest.raises(ShardsUnavailableError) as error:
+            await redis.mget(keys[:100])
+
+        failed = [
+            i
+            for i, key in enumerate(keys[:100])
+            if redis.ring.get_node(key) == failed_url
+        ]
+        assert error.value.failed == failed
+        assert error.value.values == [
+            None if i in failed else key.encode() for i, key in enumerate(keys[:100])
+        ]
+
+    @pytest.mark.asyncio()
+    async def test_all_nodes_failed(self, nodes: Dict[str, MemoryRedis]):
+        redis = ShardedRedis(nodes)
+        for node in nodes.values():
+            node.mget = AsyncMock(side_effect=ConnectionError)
+
+        with pytest.raises(ConnectionError):
+            await redis.mget(keys[:100])
+
+    @pytest.mark.asyncio()
+    @patch("services.caching.CACHE_REQUESTS.inc")
+    async def test_get_many_reads_keys_of_failed_node_as_misses(
+        self, inc_mock: Mock, nodes: Dict[str, MemoryRedis]
+    ):
+        redis = ShardedRedis(nodes)
+        await redis.set("Users:1", b'{"id": 1}')
+        await redis.set("Users:2", b'{"id": 2}')
+        failed_url = redis.ring.get_node("Users:1")
+        assert redis.ring.get_node("Users:2") != failed_url
+        nodes[failed_url].mget = AsyncMock(side_effect=ConnectionError)
+
+        with patch("services.caching.redis_client", redis):
+            values = await CachingService.get_many(["Users:1", "Users:2"])
+
+        assert values == [None, {"id": 2}]
+        assert inc_mock.call_args_list == [call("Users", "error"), call("Users", "hit")]
+
+    @pytest.mark.asyncio()
+    async def test_single_keys_of_failed_node_are_misses(
+        self, nodes: Dict[str, MemoryRedis]
+    ):
+        redis = ShardedRedis(nodes)
+        await redis.set("Users:1", b'{"id": 1}')
+        await redis.set("Users:2", b'{"id": 2}')
+        failed_url = redis.ring.get_node("Users:1")
+        assert redis.ring.get_node("Users:2") != failed_url
+        nodes[failed_url].get = AsyncMock(side_effect=ConnectionError)
+        nodes[failed_url].set = AsyncMock(side_effect=ConnectionError)
+
+        with patch("services.caching.redis_client", redis):
+            assert await CachingService.get_value("Users:1") is None
+            assert await CachingService.get_json("Users:1") is None
+            assert await CachingService.get_value("Users:2") == {"id": 2}
+            await CachingService.set_value("Users:1", {"id": 1})
+            await CachingService.set_value("Users:2", {"id": 3})
+
+        nodes[failed_url].set.assert_awaited_once()
+        assert decode_value(await redis.get("Users:2")) == {"id": 3}
+
+    @pytest.mark.asyncio()
+    @patch("models.services.user.UserDBService.get_users")
+    @patch("models.services.user.UserDBService.get_user")
+    async def test_users_of_failed_node_are_read_from_database(
+        self,
+        get_user_mock: AsyncMock,
+        get_users_mock: AsyncMock,
+        nodes: Dict[str, MemoryRedis],
+        user_db_fixture: User,
+    ):
+        redis = ShardedRedis(nodes)
+        get_user_mock.return_value = user_db_fixture
+        get_users_mock.return_value = [user_db_fixture]
+        # nodes of the user and of its tombstone
+        for key in ("Users:1", "Tombstone:Users:1"):
+            node = nodes[redis.ring.get_node(key)]
+            for command in ("get", "mget", "set", "delete"):
+                setattr(node, command, AsyncMock(side_effect=ConnectionError))
+
+        with patch("services.caching.redis_client", redis):
+            user_json = await UserService.get_user_json(1)
+            local_cache.clear()
+            user = await UserService.get_user(1)
+            local_cache.clear()
+            users = await UserService.get_users([1])
+
+        assert orjson.loads(user_json) == user_db_fixture.dict()
+        assert user == user_db_fixture
+        assert users == [user_db_fixture]
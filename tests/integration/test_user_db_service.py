@@ -1,126 +1,261 @@
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
-from sqlmodel import Session
+from sqlalchemy.dialects import postgresql
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from models.services.user import UserDBService
+from models.services.user import UserDBService, recent_writes
 from models.user import User
 from utils.errors import UserAlreadyExistError
 
 
+@pytest.fixture(autouse=True)
+def clear_recent_writes() -> None:
+    recent_writes.clear()
+    yield
+    recent_writes.clear()
+
+
 class TestUserDBService:
     class TestCreateUser:
+        @pytest.mark.asyncio()
         @patch("models.services.user.get_session")
-        def test_create_user_success(
-            self, get_session_mock: Mock, db_session: Session, clear_db
+        async def test_create_user_success(
+            self, get_session_mock: Mock, db_session: AsyncSession, clear_db
         ):
             get_session_mock.return_value = db_session
-            user = UserDBService.create_user("test_login", "test_password")
+            user = await UserDBService.create_user("test_login", "test_password")
 
             assert isinstance(user, User)
             assert user.id == 1
             assert user.login == "test_login"
             assert user.password == "test_password"
 
-            user_ = db_session.query(User).get(1)
+            user_ = await db_session.get(User, 1)
 
             assert user_ == user
             get_session_mock.assert_called_with()
 
+        @pytest.mark.asyncio()
         @patch("models.services.user.get_session")
-        def test_create_user_raise_user_already_exist_error(
-            self, get_session_mock: Mock, db_session: Session, clear_db
+        async def test_create_user_raise_user_already_exist_error(
+            self, get_session_mock: Mock, db_session: AsyncSession, clear_db
         ):
             get_session_mock.return_value = db_session
-            UserDBService.create_user("test_login", "test_password")
+            await UserDBService.create_user("test_login", "test_password")
 
             with pytest.raises(UserAlreadyExistError, match=""):
-                UserDBService.create_user("test_login", "test_password")
+                await UserDBService.create_user("test_login", "test_password")
 
             get_session_mock.assert_called_with()
 
-    class TestGetUser:
+        @pytest.mark.asyncio()
         @patch("models.services.user.get_session")
-        def test_get_user_by_id_success(
-            self, get_session_mock: Mock, db_session: Session, clear_db
+        async def test_create_user_postgres_statement(self, get_session_mock: Mock):
+            session = AsyncMock()
+            session.bind.dialect = postgresql.asyncpg.dialect()
+            row = Mock(
+                _mapping={
+                    "id": 1,
+                    "login": "test_login",
+                    "password": "test_password",
+                    "name": None,
+                }
+            )
+            session.execute.return_value = Mock(first=Mock(return_value=row))
+            get_session_mock.return_value.__aenter__.return_value = session
+
+            user = await UserDBService.create_user("test_login", "test_password")
+
+            assert user.id == 1
+            statement = str(
+                session.execute.await_args[0][0].compile(dialect=session.bind.dialect)
+            )
+            assert "ON CONFLICT (login) DO NOTHING RETURNING" in statement
+            session.commit.assert_awaited_once()
+
+    class TestGetUser:
+        @pytest.mark.asyncio()
+        @patch("models.services.user.get_read_session")
+        async def test_get_user_by_id_success(
+            self, get_read_session_mock: Mock, db_session: AsyncSession, clear_db
         ):
-            get_session_mock.return_value = db_session
+            get_read_session_mock.return_value = db_session
             user = User(login="test_login", password="test_password")
             db_session.add(user)
-            db_session.commit()
+            await db_session.commit()
 
-            user_ = UserDBService.get_user(user_id=1)
+            user_ = await UserDBService.get_user(user_id=1)
 
             assert user == user_
-            get_session_mock.assert_called_with()
+            get_read_session_mock.assert_called_with(False)
 
-        @patch("models.services.user.get_session")
-        def test_get_user_by_id_not_found(
-            self, get_session_mock: Mock, db_session: Session, clear_db
+        @pytest.mark.asyncio()
+        @patch("models.services.user.get_read_session")
+        async def test_get_user_by_id_not_found(
+            self, get_read_session_mock: Mock, db_session: AsyncSession, clear_db
         ):
-            get_session_mock.return_value = db_session
+            get_read_session_mock.return_value = db_session
             user = User(login="test_login", password="test_password")
             db_session.add(user)
-            db_session.commit()
+            await db_session.commit()
 
-            user_ = UserDBService.get_user(user_id=2)
+            user_ = await UserDBService.get_user(user_id=2)
 
             assert user_ is None
-            get_session_mock.assert_called_with()
+            get_read_session_mock.assert_called_with(False)
 
-        @patch("models.services.user.get_session")
-        def test_get_user_by_login_success(
-            self, get_session_mock: Mock, db_session: Session, clear_db
+        @pytest.mark.asyncio()
+        @patch("models.services.user.get_read_session")
+        async def test_get_user_by_login_success(
+            self, get_read_session_mock: Mock, db_session: AsyncSession, clear_db
         ):
-            get_session_mock.return_value = db_session
+            get_read_session_mock.return_value = db_session
             user = User(login="test_login", password="test_password")
             db_session.add(user)
-            db_session.commit()
+            await db_session.commit()
 
-            user_ = UserDBService.get_user(login="test_login")
+            user_ = await UserDBService.get_user(login="test_login")
 
             assert user == user_
-            get_session_mock.assert_called_with()
+            get_read_session_mock.assert_called_with(False)
 
-        @patch("models.services.user.get_session")
-        def test_get_user_by_login_not_found(
-            self, get_session_mock: Mock, db_session: Session, clear_db
+        @pytest.mark.asyncio()
+        @patch("models.services.user.get_read_session")
+        async def test_get_user_by_login_not_found(
+            self, get_read_session_mock: Mock, db_session: AsyncSession, clear_db
         ):
-            get_session_mock.return_value = db_session
+            get_read_session_mock.return_value = db_session
             user = User(login="test_login", password="test_password")
             db_session.add(user)
-            db_session.commit()
+            await db_session.commit()
 
-            user_ = UserDBService.get_user(login="not_existed")
+            user_ = await UserDBService.get_user(login="not_existed")
 
             assert user_ is None
-            get_session_mock.assert_called_with()
+            get_read_session_mock.assert_called_with(False)
+
+    class TestGetUsers:
+        @pytest.mark.asyncio()
+        @patch("models.services.user.get_read_session")
+        async def test_get_users_success(
+            self, get_read_session_mock: Mock, db_session: AsyncSession, clear_db
+        ):
+            get_read_session_mock.return_value = db_session
+            db_session.add(User(login="first", password="test_password"))
+            db_session.add(User(login="second", password="test_password"))
+            await db_session.commit()
+
+            users = await UserDBService.get_users([2, 3])
+
+            assert [user.login for user in users] == ["second"]
+            get_read_session_mock.assert_called_with(False)
+
+    class TestGetRecentUserIds:
+        @pytest.mark.asyncio()
+        @patch("models.services.user.get_read_session")
+        async def test_get_recent_user_ids_success(
+            self, get_read_session_mock: Mock, db_session: AsyncSession, clear_db
+        ):
+            get_read_session_mock.return_value = db_session
+            for login in ("first", "second", "third"):
+                db_session.add(User(login=login, password="test_password"))
+            await db_session.commit()
+
+            assert await UserDBService.get_recent_user_ids(2) == [3, 2]
+
+        @pytest.mark.asyncio()
+        @patch("models.services.user.get_read_session")
+        @patch("models.services.user.get_session")
+        async def test_read_your_writes_from_primary(
+            self,
+            get_session_mock: Mock,
+            get_read_session_mock: Mock,
+            db_session: AsyncSession,
+            clear_db,
+        ):
+            get_session_mock.return_value = db_session
+            get_read_session_mock.return_value = db_session
+            user = await UserDBService.create_user("test_login", "test_password")
+
+            assert await UserDBService.get_user(login="test_login") == user
+            get_read_session_mock.assert_called_with(True)
+            assert await UserDBService.get_users([1, 2]) == [user]
+            get_read_session_mock.assert_called_with(True)
+            assert await UserDBService.get_user(user_id=2) is None
+            get_read_session_mock.assert_called_with(False)
+
+    class TestStreamUserKeys:
+        @pytest.mark.asyncio()
+        @patch("models.services.user.get_read_session")
+        async def test_stream_user_keys_success(
+            self, get_read_session_mock: Mock, db_session: AsyncSession, clear_db
+        ):
+            get_read_session_mock.return_value = db_session
+            for login in ("first", "second", "third"):
+                db_session.add(User(login=login, password="test_password"))
+            await db_session.commit()
+
+            keys = [key async for key in UserDBService.stream_user_keys(batch_size=2)]
+            assert sorted(keys) == [(1, "first"), (2, "second"), (3, "third")]
+            assert await UserDBService.count_users() == 3
 
     class TestUpdateUser:
+        @pytest.mark.asyncio()
         @patch("models.services.user.get_session")
-        def test_update_user_password(
-            self, get_session_mock: Mock, db_session: Session, clear_db
+        async def test_update_user_password(
+            self, get_session_mock: Mock, db_session: AsyncSession, clear_db
         ):
             get_session_mock.return_value = db_session
             user = User(login="test_login", password="test_password")
             db_session.add(user)
-            db_session.commit()
+            await db_session.commit()
 
-            user_ = UserDBService.update_user(user, password="new_password")
+            user_ = await UserDBService.update_user(1, password="new_password")
 
             assert user_.password == "new_password"
+            assert user_.login == "test_login"
             get_session_mock.assert_called_with()
 
+        @pytest.mark.asyncio()
         @patch("models.services.user.get_session")
-        def test_update_user_name(
-            self, get_session_mock: Mock, db_session: Session, clear_db
+        async def test_update_user_name(
+            self, get_session_mock: Mock, db_session: AsyncSession, clear_db
         ):
             get_session_mock.return_value = db_session
             user = User(login="test_login", password="test_password")
             db_session.add(user)
-            db_session.commit()
+            await db_session.commit()
 
-            user_ = UserDBService.update_user(user, name="new_name")
+            user_ = await UserDBService.update_user(1, name="new_name")
 
             assert user_.name == "new_name"
+            assert user_.password == "test_password"
+            get_session_mock.assert_called_with()
+
+        @pytest.mark.asyncio()
+        @patch("models.services.user.get_session")
+        async def test_update_user_not_found(
+            self, get_session_mock: Mock, db_session: AsyncSession, clear_db
+        ):
+            get_session_mock.return_value = db_session
+
+            user_ = await UserDBService.update_user(1, name="new_name")
+
+            assert user_ is None
             get_session_mock.assert_called_with()
+
+        @pytest.mark.asyncio()
+        @patch("models.services.user.get_read_session")
+        async def test_update_user_without_changes(
+            self, get_read_session_mock: Mock, db_session: AsyncSession, clear_db
+        ):
+            get_read_session_mock.return_value = db_session
+            user = User(login="test_login", password="test_password")
+            db_session.add(user)
+            await db_session.commit()
+
+            user_ = await UserDBService.update_user(1)
+
+            assert user_ == user
+            get_read_session_mock.assert_called_with(False)
@@ -1,8 +1,22 @@
-from unittest.mock import AsyncMock, patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, Mock, call, patch
 
 import pytest
+from aioredis.exceptions import ConnectionError
 
-from services.caching import CachingService
+from config import Config
+from services.caching import (
+    CachingService,
+    HitCounter,
+    JsonCodec,
+    LocalCache,
+    MsgpackCodec,
+    OrjsonCodec,
+    SingleFlight,
+    codec,
+    decode_value,
+    local_cache,
+)
 
 
 class TestCachingService:
@@ -10,7 +24,7 @@ class TestCachingService:
         @pytest.mark.asyncio()
         @patch("services.caching.redis_client.get", new_callable=AsyncMock)
         async def test_get_value_success(self, get_value_mock: AsyncMock):
-            get_value_mock.return_value = "1"
+            get_value_mock.return_value = b"J11"
 
             result = await CachingService.get_value("test")
 
@@ -26,20 +40,422 @@ class TestCachingService:
 
             assert result is None
 
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.get", new_callable=AsyncMock)
+        async def test_get_value_from_local_cache(self, get_value_mock: AsyncMock):
+            get_value_mock.return_value = b"J11"
+            await CachingService.get_value("test")
+
+            result = await CachingService.get_value("test")
+
+            assert result == 1
+            get_value_mock.assert_awaited_once_with("test")
+
+    class TestGetJson:
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.get", new_callable=AsyncMock)
+        async def test_get_json_returns_stored_json(self, get_value_mock: AsyncMock):
+            get_value_mock.return_value = b'J1{"id": 1}'
+
+            result = await CachingService.get_json("test")
+
+            assert result == b'{"id": 1}'
+            assert local_cache.get("test") == {"id": 1}
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.get", new_callable=AsyncMock)
+        async def test_get_json_renders_msgpack(self, get_value_mock: AsyncMock):
+            get_value_mock.return_value = MsgpackCodec().encode({"id": 1})
+
+            assert await CachingService.get_json("test") == b'{"id":1}'
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.get", new_callable=AsyncMock)
+        async def test_get_json_from_local_cache(self, get_value_mock: AsyncMock):
+            local_cache.set("test", {"id": 1})
+
+            assert await CachingService.get_json("test") == b'{"id":1}'
+            get_value_mock.assert_not_awaited()
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.get", new_callable=AsyncMock)
+        async def test_get_json_not_found(self, get_value_mock: AsyncMock):
+            get_value_mock.return_value = None
+
+            assert await CachingService.get_json("test") is None
+
+    class TestGetMany:
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.mget", new_callable=AsyncMock)
+        async def test_get_many_success(self, mget_mock: AsyncMock):
+            local_cache.set("local", 1)
+            mget_mock.return_value = [b"J12", None]
+
+            result = await CachingService.get_many(["remote", "local", "missing"])
+
+            assert result == [2, 1, None]
+            mget_mock.assert_awaited_once_with(["remote", "missing"])
+            assert local_cache.get("remote") == 2
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.mget", new_callable=AsyncMock)
+        async def test_get_many_all_local(self, mget_mock: AsyncMock):
+            local_cache.set("local", 1)
+
+            assert await CachingService.get_many(["local"]) == [1]
+            mget_mock.assert_not_awaited()
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.CACHE_REQUESTS.inc")
+        @patch("services.caching.redis_client.mget", new_callable=AsyncMock)
+        async def test_get_many_counts_lookups(
+            self, mget_mock: AsyncMock, inc_mock: Mock
+        ):
+            local_cache.set("Users:1", 1)
+            mget_mock.return_value = [b"J12", None]
+
+            await CachingService.get_many(["Users:1", "Users:2", "Users:3"])
+
+            assert inc_mock.call_args_list == [
+                call("Users", "local_hit"),
+                call("Users", "hit"),
+                call("Users", "miss"),
+            ]
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.CACHE_REQUESTS.inc")
+        @patch("services.caching.redis_client.mget", new_callable=AsyncMock)
+        async def test_get_many_counts_errors(
+            self, mget_mock: AsyncMock, inc_mock: Mock
+        ):
+            mget_mock.side_effect = ConnectionError
+
+            # keys of the unavailable cache node are read as if missing
+            values = await CachingService.get_many(["Users:1", "Users:2"])
+
+            assert values == [None, None]
+            assert inc_mock.call_args_list == [
+                call("Users", "error"),
+                call("Users", "error"),
+            ]
+
+    class TestTombstones:
+        @pytest.mark.asyncio()
+        @patch("services.caching.TOMBSTONE_HITS.inc")
+        @patch("services.caching.redis_client.mget", new_callable=AsyncMock)
+        async def test_get_tombstones_counts_hits(
+            self, mget_mock: AsyncMock, inc_mock: Mock
+        ):
+            mget_mock.return_value = [b"J11", None]
+
+            result = await CachingService.get_tombstones(["Users:1", "Users:2"])
+
+            assert result == [True, False]
+            mget_mock.assert_awaited_once_with(
+                ["Tombstone:Users:1", "Tombstone:Users:2"]
+            )
+            inc_mock.assert_called_once_with("Users")
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.pipeline")
+        async def test_set_tombstones_with_short_ttl(
+            self, pipeline_mock: Mock, config: Config
+        ):
+            pipeline = pipeline_mock.return_value.__aenter__.return_value
+            pipeline.set = Mock()
+
+            await CachingService.set_tombstones(["Users:1"])
+
+            pipeline.set.assert_called_once_with(
+                "Tombstone:Users:1", b"J11", ex=config.CACHE_TOMBSTONE_TTL
+            )
+
+    class TestIncrementScores:
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.pipeline")
+        async def test_increment_scores_success(self, pipeline_mock: Mock):
+            pipeline = pipeline_mock.return_value.__aenter__.return_value
+            pipeline.zincrby = Mock()
+            pipeline.zremrangebyrank = Mock()
+            pipeline.expire = Mock()
+
+            await CachingService.increment_scores("hot", {1: 2, 3: 1}, 10, 60)
+
+            assert pipeline.zincrby.call_args_list == [
+                call("hot", 2, 1),
+                call("hot", 1, 3),
+            ]
+            pipeline.zremrangebyrank.assert_called_once_with("hot", 0, -11)
+            pipeline.expire.assert_called_once_with("hot", 60)
+            pipeline.execute.assert_awaited_once()
+
+    class TestSetMany:
+        @pytest.mark.asyncio()
+        @patch("services.caching.random.uniform", Mock(return_value=0))
+        @patch("services.caching.redis_client.pipeline")
+        async def test_set_many_success(self, pipeline_mock: Mock):
+            pipeline = pipeline_mock.return_value.__aenter__.return_value
+            pipeline.set, pipeline.execute = Mock(), AsyncMock()
+
+            await CachingService.set_many({"first": 1, "second": 2})
+
+            pipeline_mock.assert_called_once_with(transaction=False)
+            pipeline.set.assert_has_calls(
+                [call("first", b"J11", ex=3600), call("second", b"J12", ex=3600)]
+            )
+            pipeline.execute.assert_awaited_once()
+            assert local_cache.get("second") == 2
+
     class TestSetValue:
         @pytest.mark.asyncio()
+        @patch("services.caching.random.uniform", Mock(return_value=0))
         @patch("services.caching.redis_client.set", new_callable=AsyncMock)
         async def test_set_value_success(self, set_value_mock: AsyncMock):
             set_value_mock.return_value = "1"
 
             await CachingService.set_value("test", 1)
 
-            set_value_mock.assert_awaited_with("test", "1")
+            set_value_mock.assert_awaited_with("test", b"J11", ex=3600)
+            assert local_cache.get("test") == 1
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.set", new_callable=AsyncMock)
+        async def test_set_value_with_ttl(self, set_value_mock: AsyncMock):
+            await CachingService.set_value("test", 1, ttl=10)
+
+            set_value_mock.assert_awaited_with("test", b"J11", ex=10)
+
+    class TestReplaceValue:
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.pipeline")
+        async def test_replace_value_invalidates_other_workers(
+            self, pipeline_mock: Mock
+        ):
+            pipeline = pipeline_mock.return_value.__aenter__.return_value
+            pipeline.set, pipeline.publish = Mock(), Mock()
+            pipeline.execute = AsyncMock()
+
+            await CachingService.replace_value("Users:1", {"id": 1}, ttl=10)
+
+            pipeline.set.assert_called_once_with(
+                "Users:1", codec.encode({"id": 1}), ex=10
+            )
+            pipeline.publish.assert_called_once_with("cache:invalidate", "Users:1")
+            pipeline.execute.assert_awaited_once()
+            assert local_cache.get("Users:1") == {"id": 1}
+
+    class TestGetTTL:
+        @patch("services.caching.config.CACHE_TTL_JITTER", 0.1)
+        @patch("services.caching.config.CACHE_NAMESPACE_TTLS", {"Users": 100})
+        def test_get_ttl_of_namespace_with_jitter(self):
+            ttls = {CachingService.get_ttl("Users:1") for _ in range(100)}
+
+            assert min(ttls) >= 90
+            assert max(ttls) <= 110
+            assert len(ttls) > 1
+
+        @patch("services.caching.config.CACHE_TTL_JITTER", 0)
+        @patch("services.caching.config.CACHE_TTL", 50)
+        def test_get_ttl_of_unknown_namespace(self):
+            assert CachingService.get_ttl("Unknown:1") == 50
 
     class TestDeleteKey:
         @pytest.mark.asyncio()
-        @patch("services.caching.redis_client.delete", new_callable=AsyncMock)
-        async def test_delete_key_success(self, delete_key_mock: AsyncMock):
+        @patch("services.caching.redis_client.pipeline")
+        async def test_delete_key_success(self, pipeline_mock: Mock):
+            pipeline = pipeline_mock.return_value.__aenter__.return_value
+            pipeline.delete, pipeline.publish = Mock(), Mock()
+            pipeline.execute = AsyncMock()
+            local_cache.set("test", 1)
+
             await CachingService.delete_key("test")
 
-            delete_key_mock.assert_awaited_with(*["test"])
+            pipeline.delete.assert_called_once_with(*["test"])
+            pipeline.publish.assert_called_once_with("cache:invalidate", "test")
+            pipeline.execute.assert_awaited_once()
+            assert local_cache.get("test") is None
+
+    class TestDeleteMany:
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.pipeline")
+        async def test_delete_many_success(self, pipeline_mock: Mock):
+            pipeline = pipeline_mock.return_value.__aenter__.return_value
+            pipeline.delete, pipeline.publish = Mock(), Mock()
+            pipeline.execute = AsyncMock()
+
+            await CachingService.delete_many(["first", "second"])
+
+            pipeline_mock.assert_called_once_with(transaction=False)
+            pipeline.delete.assert_called_once_with("first", "second")
+            pipeline.publish.assert_has_calls(
+                [call("cache:invalidate", "first"), call("cache:invalidate", "second")]
+            )
+            pipeline.execute.assert_awaited_once()
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.pipeline")
+        async def test_delete_many_without_keys(self, pipeline_mock: Mock):
+            await CachingService.delete_many([])
+
+            pipeline_mock.assert_not_called()
+
+    class TestLock:
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.set", new_callable=AsyncMock)
+        async def test_acquire_lock_success(self, set_value_mock: AsyncMock):
+            set_value_mock.return_value = True
+
+            token = await CachingService.acquire_lock("test")
+
+            assert token
+            set_value_mock.assert_awaited_with("Lock:test", token, nx=True, px=1000)
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.set", new_callable=AsyncMock)
+        async def test_acquire_lock_already_taken(self, set_value_mock: AsyncMock):
+            set_value_mock.return_value = None
+
+            assert await CachingService.acquire_lock("test") is None
+
+    class TestListenInvalidations:
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.pubsub")
+        async def test_listen_invalidations_drops_local_key(self, pubsub_mock: Mock):
+            async def get_message(**kwargs):
+                if not messages:
+                    # application shutdown
+                    raise asyncio.CancelledError
+                message = messages.pop(0)
+                if message is None:
+                    # keys cached after the subscription is established
+                    local_cache.set("test", 1)
+                    local_cache.set("other", 2)
+                return message
+
+            messages = [None, {"type": "message", "data": b"test"}]
+            pubsub = MagicMock(subscribe=AsyncMock(), reset=AsyncMock())
+            pubsub.get_message = get_message
+            pubsub_mock.return_value = pubsub
+
+            with pytest.raises(asyncio.CancelledError):
+                await CachingService.listen_invalidations()
+
+            pubsub.subscribe.assert_awaited_with("cache:invalidate")
+            pubsub.reset.assert_awaited()
+            assert local_cache.get("test") is None
+            assert local_cache.get("other") == 2
+
+        @pytest.mark.asyncio()
+        @patch("services.caching.redis_client.pubsub")
+        async def test_listen_invalidations_resubscribes(self, pubsub_mock: Mock):
+            pubsub = MagicMock(reset=AsyncMock())
+            pubsub.subscribe = AsyncMock(
+                side_effect=[ConnectionError, asyncio.CancelledError]
+            )
+            pubsub_mock.return_value = pubsub
+
+            with pytest.raises(asyncio.CancelledError):
+                await CachingService.listen_invalidations(reconnect_delay=0)
+
+            assert pubsub.subscribe.await_count == 2
+            assert pubsub.reset.await_count == 2
+
+
+class TestHitCounter:
+    @pytest.mark.asyncio()
+    @patch("services.caching.CachingService.increment_scores")
+    async def test_counts_are_flushed_once(self, increment_scores_mock: AsyncMock):
+        hits = HitCounter("hot", 10, 60)
+        hits.record(1)
+        hits.record(1)
+        hits.record(2)
+
+        await hits.flush()
+        await hits.flush()
+
+        increment_scores_mock.assert_awaited_once_with("hot", {1: 2, 2: 1}, 10, 60)
+
+
+class TestLocalCache:
+    def test_least_recently_used_key_is_evicted(self):
+        cache = LocalCache(maxsize=2, ttl=60)
+        cache.set("first", 1)
+        cache.set("second", 2)
+        cache.get("first")
+        cache.set("third", 3)
+
+        assert cache.get("second") is None
+        assert cache.get("first") == 1
+        assert cache.get("third") == 3
+        assert len(cache) == 2
+
+    @patch("services.caching.time.monotonic")
+    def test_expired_key_is_not_returned(self, monotonic_mock):
+        monotonic_mock.return_value = 100
+        cache = LocalCache(maxsize=2, ttl=5)
+        cache.set("test", 1)
+
+        monotonic_mock.return_value = 106
+
+        assert cache.get("test") is None
+        assert len(cache) == 0
+
+    def test_zero_size_disables_cache(self):
+        cache = LocalCache(maxsize=0, ttl=60)
+        cache.set("test", 1)
+
+        assert cache.get("test") is None
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio()
+    async def test_concurrent_calls_are_coalesced(self):
+        single_flight = SingleFlight()
+        func = AsyncMock(return_value=1)
+
+        results = await asyncio.gather(
+            *(single_flight.do("test", func) for _ in range(10))
+        )
+
+        assert results == [1] * 10
+        func.assert_awaited_once()
+        assert len(single_flight) == 0
+
+    @pytest.mark.asyncio()
+    async def test_sequential_calls_are_not_coalesced(self):
+        single_flight = SingleFlight()
+        func = AsyncMock(return_value=1)
+
+        await single_flight.do("test", func)
+        await single_flight.do("test", func)
+
+        assert func.await_count == 2
+
+    @pytest.mark.asyncio()
+    async def test_cancelled_caller_does_not_cancel_call(self):
+        single_flight = SingleFlight()
+
+        async def func():
+            await asyncio.sleep(0.01)
+            return 1
+
+        first = asyncio.ensure_future(single_flight.do("test", func))
+        second = asyncio.ensure_future(single_flight.do("test", func))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == 1
+
+
+class TestCodecs:
+    @pytest.mark.parametrize("codec", [JsonCodec(), OrjsonCodec(), MsgpackCodec()])
+    def test_encoded_value_is_decoded(self, codec):
+        value = {"id": 1, "login": "test_user", "name": None}
+
+        assert decode_value(codec.encode(value)) == value
+
+    def test_json_and_orjson_share_format(self):
+        assert OrjsonCodec().encode([1]) == JsonCodec().encode([1]) == b"J1[1]"
+
+    def test_value_without_tag_is_decoded_as_json(self):
+        assert decode_value(b'{"id": 1}') == {"id": 1}
@@ -0,0 +1,39 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from services.hashing import HasherService, pwd_context
+from utils.errors import HashingQueueFullError
+
+
+class TestHasherService:
+    class TestHashPassword:
+        @pytest.mark.asyncio()
+        async def test_hash_password_success(self):
+            hashed_password = await HasherService.hash_password("test_password")
+
+            assert hashed_password != "test_password"
+            assert pwd_context.verify("test_password", hashed_password)
+
+        @pytest.mark.asyncio()
+        @patch("services.hashing.config.HASHING_QUEUE_TIMEOUT", 0.01)
+        @patch("services.hashing.config.HASHING_QUEUE_SIZE", 1)
+        async def test_hash_password_queue_full(self):
+            HasherService._queue = None
+            queue = HasherService._get_queue()
+            await queue.acquire()
+
+            with pytest.raises(HashingQueueFullError):
+                await HasherService.hash_password("test_password")
+
+            queue.release()
+            HasherService._queue = None
+
+    class TestShutdown:
+        def test_shutdown_doesnt_wait_for_queued_hashes(self):
+            executor = Mock()
+            with patch.object(HasherService, "_executor", executor):
+                HasherService.shutdown()
+
+                assert HasherService._executor is None
+            executor.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
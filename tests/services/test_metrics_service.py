@@ -0,0 +1,75 @@
+import pytest
+
+from services.metrics import Counter, Histogram, MetricsRegistry, measure, timed
+
+
+class TestCounter:
+    def test_counter_renders_labelled_values(self):
+        counter = Counter("requests_total", "Requests", ("result",))
+        counter.inc("hit")
+        counter.inc("hit")
+        counter.inc("miss", amount=3)
+
+        assert list(counter.render()) == [
+            "# HELP requests_total Requests",
+            "# TYPE requests_total counter",
+            'requests_total{result="hit"} 2',
+            'requests_total{result="miss"} 3',
+        ]
+
+
+class TestHistogram:
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram("duration_seconds", "Duration", ("op",), (0.1, 1))
+        histogram.observe(0.05, "get")
+        histogram.observe(0.5, "get")
+        histogram.observe(2, "get")
+
+        assert list(histogram.samples()) == [
+            'duration_seconds_bucket{op="get",le="0.1"} 1',
+            'duration_seconds_bucket{op="get",le="1"} 2',
+            'duration_seconds_bucket{op="get",le="+Inf"} 3',
+            'duration_seconds_sum{op="get"} 2.55',
+            'duration_seconds_count{op="get"} 3',
+        ]
+
+    def test_bucket_bound_is_inclusive(self):
+        histogram = Histogram("duration_seconds", "Duration", buckets=(0.1,))
+        histogram.observe(0.1)
+
+        assert list(histogram.samples())[0] == 'duration_seconds_bucket{le="0.1"} 1'
+
+    def test_measure_observes_failed_block(self):
+        histogram = Histogram("duration_seconds", "Duration", ("op",))
+
+        with pytest.raises(ValueError):
+            with measure(histogram, "get"):
+                raise ValueError
+
+        assert list(histogram.samples())[-1] == 'duration_seconds_count{op="get"} 1'
+
+    @pytest.mark.asyncio()
+    async def test_timed_observes_coroutine_function(self):
+        histogram = Histogram("duration_seconds", "Duration", ("op",))
+
+        @timed(histogram, "get")
+        async def get():
+            return 1
+
+        assert await get() == 1
+        assert list(histogram.samples())[-1] == 'duration_seconds_count{op="get"} 1'
+
+
+class TestMetricsRegistry:
+    def test_registry_renders_all_metrics(self):
+        registry = MetricsRegistry()
+        registry.register(Counter("a_total", "A")).inc()
+        registry.register(Counter("b_total", "B"))
+
+        assert registry.render() == (
+            "# HELP a_total A\n"
+            "# TYPE a_total counter\n"
+            "a_total 1\n"
+            "# HELP b_total B\n"
+            "# TYPE b_total counter\n"
+        )
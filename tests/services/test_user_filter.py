@@ -0,0 +1,85 @@
+from typing import AsyncIterator, Tuple
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from services.user_filter import UserFilter
+
+user_db_service_path = "models.services.user.UserDBService"
+
+
+async def stream_user_keys(primary: bool = False) -> AsyncIterator[Tuple[int, str]]:
+    assert primary
+    for user_id, login in ((1, "first"), (2, "second"), (4, "fourth")):
+        yield user_id, login
+
+
+class TestUserFilter:
+    def test_not_built_filter_knows_nothing(self):
+        user_filter = UserFilter()
+
+        assert not user_filter.ready
+        assert not user_filter.is_missing_id(3)
+        assert not user_filter.is_login_likely_taken("first")
+        assert user_filter.get_stats() == {"ready": False}
+
+    @pytest.mark.asyncio()
+    @patch("services.user_filter.config.USER_FILTER_ID_MARGIN", 0)
+    async def test_build(self):
+        user_filter = UserFilter()
+        count_users_mock = AsyncMock(return_value=3)
+        with patch(f"{user_db_service_path}.count_users", count_users_mock), patch(
+            f"{user_db_service_path}.stream_user_keys", stream_user_keys
+        ):
+            await user_filter.build()
+
+        count_users_mock.assert_awaited_once_with(primary=True)
+        assert user_filter.ready
+        assert user_filter.max_scanned_id == 4
+        assert not user_filter.is_missing_id(1)
+        assert user_filter.is_missing_id(3)
+        # created after the scan, possibly by another worker
+        assert not user_filter.is_missing_id(5)
+        assert user_filter.is_login_likely_taken("second")
+        assert user_filter.get_stats()["users"] == 3
+        assert user_filter.get_stats()["missing_ids"] == 1
+
+    @pytest.mark.asyncio()
+    @patch("services.user_filter.config.USER_FILTER_ID_MARGIN", 2)
+    async def test_id_committed_after_build_within_margin(self):
+        user_filter = UserFilter()
+        with patch(
+            f"{user_db_service_path}.count_users", AsyncMock(return_value=3)
+        ), patch(f"{user_db_service_path}.stream_user_keys", stream_user_keys):
+            await user_filter.build()
+
+        # user 3 took its id before user 4 but committed after the scan
+        assert not user_filter.is_missing_id(3)
+        assert user_filter.get_stats()["missing_ids"] == 0
+
+    @pytest.mark.asyncio()
+    @patch(f"{user_db_service_path}.count_users")
+    async def test_build_or_skip_failure(self, count_users_mock: AsyncMock):
+        count_users_mock.side_effect = ConnectionError
+        user_filter = UserFilter()
+
+        await user_filter.build_or_skip()
+        assert not user_filter.ready
+
+    @pytest.mark.asyncio()
+    async def test_add(self):
+        user_filter = UserFilter()
+        with patch(
+            f"{user_db_service_path}.count_users", AsyncMock(return_value=3)
+        ), patch(f"{user_db_service_path}.stream_user_keys", stream_user_keys):
+            await user_filter.build()
+
+        user_filter.add(3, "third")
+
+        assert not user_filter.is_missing_id(3)
+        assert user_filter.is_login_likely_taken("third")
+        assert user_filter.get_stats()["observed_false_positive_rate"] == 0.0
+
+        user_filter.observe_login_check(taken=False)
+        assert user_filter.get_stats()["login_checks"] == 1
+        assert user_filter.get_stats()["observed_false_positive_rate"] == 1.0
@@ -1,6 +1,9 @@
+import asyncio
 from unittest.mock import AsyncMock, Mock, call, patch
 
+import orjson
 import pytest
+from aioredis.exceptions import ConnectionError
 
 from models.user import User
 from services.user import UserService
@@ -11,58 +14,163 @@ hasher_service_path = "services.hashing.HasherService"
 caching_service_path = "services.caching.CachingService"
 
 
+@pytest.fixture(autouse=True)
+def tombstones_mock() -> Mock:
+    """No users are known to be missing unless a test says otherwise"""
+    with patch(
+        f"{caching_service_path}.get_tombstones",
+        side_effect=lambda keys: [False] * len(keys),
+    ) as get_tombstones_mock, patch(
+        f"{caching_service_path}.set_tombstones"
+    ) as set_tombstones_mock, patch(
+        f"{caching_service_path}.delete_tombstones"
+    ) as delete_tombstones_mock:
+        yield Mock(
+            get=get_tombstones_mock,
+            set=set_tombstones_mock,
+            delete=delete_tombstones_mock,
+        )
+
+
 class TestUserService:
     class TestCreateUser:
         @pytest.mark.asyncio()
         @patch(f"{user_db_service_path}.create_user")
-        @patch(f"{hasher_service_path}.get_password_hash")
+        @patch(f"{hasher_service_path}.hash_password")
         async def test_create_user_successfully(
             self,
-            get_password_hash_mock: Mock,
-            create_user_mock: Mock,
+            hash_password_mock: AsyncMock,
+            create_user_mock: AsyncMock,
             user_db_fixture: User,
+            tombstones_mock: Mock,
         ):
-            get_password_hash_mock.return_value = "hashed_password"
+            hash_password_mock.return_value = "hashed_password"
             user_db_fixture.password = "hashed_password"
             create_user_mock.return_value = user_db_fixture
 
             user = await UserService.create_user("test_login", "test_password")
             assert user == user_db_fixture
 
-            get_password_hash_mock.assert_called_with("test_password")
+            hash_password_mock.assert_awaited_with("test_password")
             create_user_mock.assert_called_with("test_login", "hashed_password")
+            tombstones_mock.delete.assert_awaited_once_with(
+                ["Users:1", "Users:login:test_login"]
+            )
 
         @pytest.mark.asyncio()
         @patch(f"{user_db_service_path}.create_user")
-        @patch(f"{hasher_service_path}.get_password_hash")
+        @patch(f"{hasher_service_path}.hash_password")
+        async def test_create_user_with_cache_unavailable(
+            self,
+            hash_password_mock: AsyncMock,
+            create_user_mock: AsyncMock,
+            user_db_fixture: User,
+            tombstones_mock: Mock,
+        ):
+            create_user_mock.return_value = user_db_fixture
+            tombstones_mock.delete.side_effect = ConnectionError
+
+            user = await UserService.create_user("test_login", "test_password")
+            assert user == user_db_fixture
+
+        @pytest.mark.asyncio()
+        @patch(f"{user_db_service_path}.create_user")
+        @patch(f"{hasher_service_path}.hash_password")
         async def test_create_user_already_existed(
             self,
-            get_password_hash_mock: Mock,
-            create_user_mock: Mock,
+            hash_password_mock: AsyncMock,
+            create_user_mock: AsyncMock,
             user_db_fixture: User,
         ):
-            get_password_hash_mock.return_value = "hashed_password"
+            hash_password_mock.return_value = "hashed_password"
             user_db_fixture.password = "hashed_password"
             create_user_mock.side_effect = UserAlreadyExistError
 
             with pytest.raises(UserAlreadyExistError, match=""):
                 await UserService.create_user("test_login", "test_password")
 
-            get_password_hash_mock.assert_called_with("test_password")
+            hash_password_mock.assert_awaited_with("test_password")
             create_user_mock.assert_called_with("test_login", "hashed_password")
 
+        @pytest.mark.asyncio()
+        @patch("services.user.user_filter")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{user_db_service_path}.create_user")
+        @patch(f"{hasher_service_path}.hash_password")
+        async def test_create_user_login_taken_in_filter(
+            self,
+            hash_password_mock: AsyncMock,
+            create_user_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            user_filter_mock: Mock,
+            user_db_fixture: User,
+        ):
+            user_filter_mock.is_login_likely_taken.return_value = True
+            get_user_mock.return_value = user_db_fixture
+
+            with pytest.raises(UserAlreadyExistError):
+                await UserService.create_user("test_login", "test_password")
+
+            get_user_mock.assert_awaited_once_with(login="test_login")
+            user_filter_mock.observe_login_check.assert_called_once_with(True)
+            hash_password_mock.assert_not_awaited()
+            create_user_mock.assert_not_awaited()
+
+        @pytest.mark.asyncio()
+        @patch("services.user.user_filter")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{user_db_service_path}.create_user")
+        @patch(f"{hasher_service_path}.hash_password")
+        async def test_create_user_login_false_positive_in_filter(
+            self,
+            hash_password_mock: AsyncMock,
+            create_user_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            user_filter_mock: Mock,
+            user_db_fixture: User,
+        ):
+            user_filter_mock.is_login_likely_taken.return_value = True
+            get_user_mock.return_value = None
+            hash_password_mock.return_value = "hashed_password"
+            create_user_mock.return_value = user_db_fixture
+
+            user = await UserService.create_user("test_login", "test_password")
+            assert user == user_db_fixture
+
+            user_filter_mock.observe_login_check.assert_called_once_with(False)
+            user_filter_mock.add.assert_called_once_with(1, "test_login")
+
     class TestGetUser:
         @pytest.mark.asyncio()
-        @patch("logging.warning")
+        @patch("services.user.user_filter")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_value")
+        async def test_get_user_by_user_id_missing_in_filter(
+            self,
+            get_value_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            user_filter_mock: Mock,
+        ):
+            user_filter_mock.is_missing_id.return_value = True
+
+            with pytest.raises(UserDoesNotExistError):
+                await UserService.get_user(3)
+
+            user_filter_mock.is_missing_id.assert_called_once_with(3)
+            get_value_mock.assert_not_awaited()
+            get_user_mock.assert_not_awaited()
+
+        @pytest.mark.asyncio()
+        @patch("services.user.logger.info")
         @patch(f"{caching_service_path}.set_value")
         @patch(f"{user_db_service_path}.get_user")
         @patch(f"{caching_service_path}.get_value")
         async def test_get_user_by_user_id_from_cache(
             self,
             get_value_mock: AsyncMock,
-            get_user_mock: Mock,
+            get_user_mock: AsyncMock,
             set_value_mock: AsyncMock,
-            warning_mock: Mock,
+            info_mock: Mock,
             user_db_fixture: User,
         ):
             get_value_mock.return_value = user_db_fixture.dict()
@@ -70,18 +178,12 @@ class TestUserService:
             user = await UserService.get_user(1)
             assert user == user_db_fixture
 
-            get_value_mock.assert_called_with("Users:1-None")
-            warning_mock.assert_called_with("cache hit")
-            get_user_mock.assert_not_called()
-            set_value_mock.assert_called_with(
-                "Users:1-None",
-                {
-                    "name": None,
-                    "password": "$2b$12$O3MYXaKY5uw6TJ9PSQDI5uCMh3bj8ZQjpAUtkhinrRDiOQhSkuUEi",
-                    "login": "test_user",
-                    "id": 1,
-                },
+            get_value_mock.assert_called_with("Users:1")
+            info_mock.assert_called_with(
+                "cache hit", extra={"user_id": 1, "login": None}
             )
+            get_user_mock.assert_not_called()
+            set_value_mock.assert_not_called()
 
         @pytest.mark.asyncio()
         @patch(f"{caching_service_path}.set_value")
@@ -90,7 +192,7 @@ class TestUserService:
         async def test_get_user_by_user_id_from_database(
             self,
             get_value_mock: AsyncMock,
-            get_user_mock: Mock,
+            get_user_mock: AsyncMock,
             set_value_mock: AsyncMock,
             user_db_fixture: User,
         ):
@@ -100,10 +202,10 @@ class TestUserService:
             user = await UserService.get_user(1)
             assert user == user_db_fixture
 
-            get_value_mock.assert_called_with("Users:1-None")
+            get_value_mock.assert_called_with("Users:1")
             get_user_mock.assert_called_with(1, None)
             set_value_mock.assert_called_with(
-                "Users:1-None",
+                "Users:1",
                 {
                     "name": None,
                     "password": "$2b$12$O3MYXaKY5uw6TJ9PSQDI5uCMh3bj8ZQjpAUtkhinrRDiOQhSkuUEi",
@@ -119,9 +221,10 @@ class TestUserService:
         async def test_get_user_by_user_id_user_does_not_exist(
             self,
             get_value_mock: AsyncMock,
-            get_user_mock: Mock,
+            get_user_mock: AsyncMock,
             set_value_mock: AsyncMock,
             user_db_fixture: User,
+            tombstones_mock: Mock,
         ):
             get_value_mock.return_value = None
             get_user_mock.return_value = None
@@ -129,40 +232,85 @@ class TestUserService:
             with pytest.raises(UserDoesNotExistError):
                 await UserService.get_user(1)
 
-            get_value_mock.assert_called_with("Users:1-None")
-            get_user_mock.assert_called_with(1, None)
+            get_value_mock.assert_called_with("Users:1")
+            assert get_user_mock.await_args_list == [
+                call(1, None),
+                call(1, None, primary=True),
+            ]
             set_value_mock.assert_not_called()
+            tombstones_mock.set.assert_awaited_once_with(["Users:1"])
 
         @pytest.mark.asyncio()
-        @patch("logging.warning")
+        @patch(f"{caching_service_path}.set_value")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_value")
+        async def test_get_user_missed_by_replica_is_read_from_primary(
+            self,
+            get_value_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            set_value_mock: AsyncMock,
+            user_db_fixture: User,
+            tombstones_mock: Mock,
+        ):
+            get_value_mock.return_value = None
+            # created on another worker, the replica hasn't caught up yet
+            get_user_mock.side_effect = [None, user_db_fixture]
+
+            user = await UserService.get_user(1)
+            assert user == user_db_fixture
+
+            assert get_user_mock.await_args_list == [
+                call(1, None),
+                call(1, None, primary=True),
+            ]
+            set_value_mock.assert_awaited_once_with("Users:1", user_db_fixture.dict())
+            tombstones_mock.set.assert_not_awaited()
+
+        @pytest.mark.asyncio()
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_value")
+        async def test_get_user_by_user_id_tombstone(
+            self,
+            get_value_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            tombstones_mock: Mock,
+        ):
+            get_value_mock.return_value = None
+            tombstones_mock.get.side_effect = None
+            tombstones_mock.get.return_value = [True]
+
+            with pytest.raises(UserDoesNotExistError):
+                await UserService.get_user(1)
+
+            tombstones_mock.get.assert_awaited_once_with(["Users:1"])
+            get_user_mock.assert_not_called()
+
+        @pytest.mark.asyncio()
+        @patch("services.user.logger.info")
         @patch(f"{caching_service_path}.set_value")
         @patch(f"{user_db_service_path}.get_user")
         @patch(f"{caching_service_path}.get_value")
         async def test_get_user_by_login_from_cache(
             self,
             get_value_mock: AsyncMock,
-            get_user_mock: Mock,
+            get_user_mock: AsyncMock,
             set_value_mock: AsyncMock,
-            warning_mock: Mock,
+            info_mock: Mock,
             user_db_fixture: User,
         ):
-            get_value_mock.return_value = user_db_fixture.dict()
+            get_value_mock.side_effect = [1, user_db_fixture.dict()]
 
             user = await UserService.get_user(login="test_user")
             assert user == user_db_fixture
 
-            get_value_mock.assert_called_with("Users:None-test_user")
-            warning_mock.assert_called_with("cache hit")
-            get_user_mock.assert_not_called()
-            set_value_mock.assert_called_with(
-                "Users:None-test_user",
-                {
-                    "name": None,
-                    "password": "$2b$12$O3MYXaKY5uw6TJ9PSQDI5uCMh3bj8ZQjpAUtkhinrRDiOQhSkuUEi",
-                    "login": "test_user",
-                    "id": 1,
-                },
+            get_value_mock.assert_has_calls(
+                [call("Users:login:test_user"), call("Users:1")]
             )
+            info_mock.assert_called_with(
+                "cache hit", extra={"user_id": None, "login": "test_user"}
+            )
+            get_user_mock.assert_not_called()
+            set_value_mock.assert_not_called()
 
         @pytest.mark.asyncio()
         @patch(f"{caching_service_path}.set_value")
@@ -171,7 +319,7 @@ class TestUserService:
         async def test_get_user_by_login_from_database(
             self,
             get_value_mock: AsyncMock,
-            get_user_mock: Mock,
+            get_user_mock: AsyncMock,
             set_value_mock: AsyncMock,
             user_db_fixture: User,
         ):
@@ -181,16 +329,21 @@ class TestUserService:
             user = await UserService.get_user(login="test_user")
             assert user == user_db_fixture
 
-            get_value_mock.assert_called_with("Users:None-test_user")
+            get_value_mock.assert_called_once_with("Users:login:test_user")
             get_user_mock.assert_called_with(None, "test_user")
-            set_value_mock.assert_called_with(
-                "Users:None-test_user",
-                {
-                    "name": None,
-                    "password": "$2b$12$O3MYXaKY5uw6TJ9PSQDI5uCMh3bj8ZQjpAUtkhinrRDiOQhSkuUEi",
-                    "login": "test_user",
-                    "id": 1,
-                },
+            set_value_mock.assert_has_calls(
+                [
+                    call(
+                        "Users:1",
+                        {
+                            "name": None,
+                            "password": "$2b$12$O3MYXaKY5uw6TJ9PSQDI5uCMh3bj8ZQjpAUtkhinrRDiOQhSkuUEi",
+                            "login": "test_user",
+                            "id": 1,
+                        },
+                    ),
+                    call("Users:login:test_user", 1),
+                ]
             )
 
         @pytest.mark.asyncio()
@@ -200,7 +353,7 @@ class TestUserService:
         async def test_get_user_by_login_user_does_not_exist(
             self,
             get_value_mock: AsyncMock,
-            get_user_mock: Mock,
+            get_user_mock: AsyncMock,
             set_value_mock: AsyncMock,
             user_db_fixture: User,
         ):
@@ -210,55 +363,366 @@ class TestUserService:
             with pytest.raises(UserDoesNotExistError):
                 await UserService.get_user(login="test_user")
 
-            get_value_mock.assert_called_with("Users:None-test_user")
-            get_user_mock.assert_called_with(None, "test_user")
+            get_value_mock.assert_called_once_with("Users:login:test_user")
+            assert get_user_mock.await_args_list == [
+                call(None, "test_user"),
+                call(None, "test_user", primary=True),
+            ]
+            set_value_mock.assert_not_called()
+
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.set_value")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_value")
+        async def test_get_user_by_login_with_stale_alias_from_database(
+            self,
+            get_value_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            set_value_mock: AsyncMock,
+            user_db_fixture: User,
+        ):
+            get_value_mock.side_effect = [2, {**user_db_fixture.dict(), "id": 2}]
+            get_user_mock.return_value = None
+
+            with pytest.raises(UserDoesNotExistError):
+                await UserService.get_user(login="other_user")
+
+            get_value_mock.assert_has_calls(
+                [call("Users:login:other_user"), call("Users:2")]
+            )
+            assert get_user_mock.await_args_list == [
+                call(None, "other_user"),
+                call(None, "other_user", primary=True),
+            ]
+            set_value_mock.assert_not_called()
+
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.set_value")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_value")
+        async def test_get_user_concurrent_misses_query_database_once(
+            self,
+            get_value_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            set_value_mock: AsyncMock,
+            user_db_fixture: User,
+        ):
+            async def get_user(*args):
+                await asyncio.sleep(0.01)
+                return user_db_fixture
+
+            get_value_mock.return_value = None
+            get_user_mock.side_effect = get_user
+
+            users = await asyncio.gather(*(UserService.get_user(1) for _ in range(20)))
+
+            assert users == [user_db_fixture] * 20
+            get_user_mock.assert_awaited_once_with(1, None)
+            set_value_mock.assert_awaited_once()
+
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.set_value")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_value")
+        async def test_get_user_concurrent_misses_share_error(
+            self,
+            get_value_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            set_value_mock: AsyncMock,
+        ):
+            get_value_mock.return_value = None
+            get_user_mock.return_value = None
+
+            results = await asyncio.gather(
+                *(UserService.get_user(1) for _ in range(5)), return_exceptions=True
+            )
+
+            assert all(isinstance(r, UserDoesNotExistError) for r in results)
+            assert get_user_mock.await_args_list == [
+                call(1, None),
+                call(1, None, primary=True),
+            ]
+
+        @pytest.mark.asyncio()
+        @patch("services.user.config.CACHE_LOCK_ENABLED", True)
+        @patch(f"{caching_service_path}.release_lock")
+        @patch(f"{caching_service_path}.acquire_lock")
+        @patch(f"{caching_service_path}.set_value")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_value")
+        async def test_get_user_loads_database_under_lock(
+            self,
+            get_value_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            set_value_mock: AsyncMock,
+            acquire_lock_mock: AsyncMock,
+            release_lock_mock: AsyncMock,
+            user_db_fixture: User,
+        ):
+            get_value_mock.return_value = None
+            get_user_mock.return_value = user_db_fixture
+            acquire_lock_mock.return_value = "token"
+
+            user = await UserService.get_user(1)
+
+            assert user == user_db_fixture
+            acquire_lock_mock.assert_awaited_with("Users:1")
+            get_user_mock.assert_awaited_once_with(1, None)
+            release_lock_mock.assert_awaited_with("Users:1", "token")
+
+        @pytest.mark.asyncio()
+        @patch("services.user.config.CACHE_LOCK_ENABLED", True)
+        @patch(f"{caching_service_path}.release_lock")
+        @patch(f"{caching_service_path}.acquire_lock")
+        @patch(f"{caching_service_path}.set_value")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_value")
+        async def test_get_user_waits_for_other_worker_holding_lock(
+            self,
+            get_value_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            set_value_mock: AsyncMock,
+            acquire_lock_mock: AsyncMock,
+            release_lock_mock: AsyncMock,
+            user_db_fixture: User,
+        ):
+            # other worker puts the user into the cache on the second poll
+            get_value_mock.side_effect = [None, None, user_db_fixture.dict()]
+            acquire_lock_mock.return_value = None
+
+            user = await UserService.get_user(1)
+
+            assert user == user_db_fixture
+            get_user_mock.assert_not_awaited()
+            set_value_mock.assert_not_awaited()
+            release_lock_mock.assert_not_awaited()
+
+    class TestGetUserJson:
+        @pytest.mark.asyncio()
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_json")
+        async def test_get_user_json_from_cache(
+            self, get_json_mock: AsyncMock, get_user_mock: AsyncMock
+        ):
+            get_json_mock.return_value = b'{"id":1}'
+
+            user = await UserService.get_user_json(1)
+            assert user == b'{"id":1}'
+
+            get_json_mock.assert_awaited_with("Users:1")
+            get_user_mock.assert_not_called()
+
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.set_value")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_json")
+        async def test_get_user_json_from_database(
+            self,
+            get_json_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            set_value_mock: AsyncMock,
+            user_db_fixture: User,
+        ):
+            get_json_mock.return_value = None
+            get_user_mock.return_value = user_db_fixture
+
+            user = await UserService.get_user_json(1)
+            assert orjson.loads(user) == user_db_fixture.dict()
+
+            get_user_mock.assert_called_with(1, None)
+            set_value_mock.assert_awaited_with("Users:1", user_db_fixture.dict())
+
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.set_value")
+        @patch(f"{user_db_service_path}.get_user")
+        @patch(f"{caching_service_path}.get_json")
+        async def test_get_user_json_user_does_not_exist(
+            self,
+            get_json_mock: AsyncMock,
+            get_user_mock: AsyncMock,
+            set_value_mock: AsyncMock,
+        ):
+            get_json_mock.return_value = None
+            get_user_mock.return_value = None
+
+            with pytest.raises(UserDoesNotExistError):
+                await UserService.get_user_json(1)
+
             set_value_mock.assert_not_called()
 
+    class TestGetUsers:
+        @pytest.mark.asyncio()
+        @patch("services.user.user_filter")
+        @patch(f"{caching_service_path}.set_many")
+        @patch(f"{user_db_service_path}.get_users")
+        @patch(f"{caching_service_path}.get_many")
+        async def test_get_users_missing_in_filter(
+            self,
+            get_many_mock: AsyncMock,
+            get_users_mock: AsyncMock,
+            set_many_mock: AsyncMock,
+            user_filter_mock: Mock,
+            user_db_fixture: User,
+        ):
+            user_filter_mock.is_missing_id.side_effect = lambda user_id: user_id == 3
+            get_many_mock.return_value = [user_db_fixture.dict()]
+
+            users = await UserService.get_users([1, 3])
+            assert users == [user_db_fixture, None]
+
+            get_many_mock.assert_awaited_once_with(["Users:1"])
+            get_users_mock.assert_not_awaited()
+
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.set_many")
+        @patch(f"{user_db_service_path}.get_users")
+        @patch(f"{caching_service_path}.get_many")
+        async def test_get_users_from_cache_and_database(
+            self,
+            get_many_mock: AsyncMock,
+            get_users_mock: AsyncMock,
+            set_many_mock: AsyncMock,
+            user_db_fixture: User,
+        ):
+            other_user = User(id=2, login="other_user", password="password")
+            get_many_mock.return_value = [None, user_db_fixture.dict(), None]
+            get_users_mock.return_value = [other_user]
+
+            users = await UserService.get_users([2, 1, 3, 2])
+            assert users == [other_user, user_db_fixture, None, other_user]
+
+            get_many_mock.assert_awaited_once_with(["Users:2", "Users:1", "Users:3"])
+            assert get_users_mock.await_args_list == [
+                call([2, 3]),
+                call([3], primary=True),
+            ]
+            set_many_mock.assert_awaited_once_with({"Users:2": other_user.dict()})
+
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.set_many")
+        @patch(f"{user_db_service_path}.get_users")
+        @patch(f"{caching_service_path}.get_many")
+        async def test_get_users_all_from_cache(
+            self,
+            get_many_mock: AsyncMock,
+            get_users_mock: AsyncMock,
+            set_many_mock: AsyncMock,
+            user_db_fixture: User,
+        ):
+            get_many_mock.return_value = [user_db_fixture.dict()]
+
+            users = await UserService.get_users([1])
+            assert users == [user_db_fixture]
+
+            get_users_mock.assert_not_awaited()
+            set_many_mock.assert_not_awaited()
+
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.set_many")
+        @patch(f"{user_db_service_path}.get_users")
+        @patch(f"{caching_service_path}.get_many")
+        async def test_get_users_tombstones(
+            self,
+            get_many_mock: AsyncMock,
+            get_users_mock: AsyncMock,
+            set_many_mock: AsyncMock,
+            tombstones_mock: Mock,
+        ):
+            get_many_mock.return_value = [None, None]
+            tombstones_mock.get.side_effect = None
+            tombstones_mock.get.return_value = [True, False]
+            get_users_mock.return_value = []
+
+            users = await UserService.get_users([1, 2])
+            assert users == [None, None]
+
+            tombstones_mock.get.assert_awaited_once_with(["Users:1", "Users:2"])
+            assert get_users_mock.await_args_list == [
+                call([2]),
+                call([2], primary=True),
+            ]
+            tombstones_mock.set.assert_awaited_once_with(["Users:2"])
+
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.set_many")
+        @patch(f"{user_db_service_path}.get_users")
+        @patch(f"{caching_service_path}.get_many")
+        async def test_get_users_missed_by_replica_are_read_from_primary(
+            self,
+            get_many_mock: AsyncMock,
+            get_users_mock: AsyncMock,
+            set_many_mock: AsyncMock,
+            user_db_fixture: User,
+            tombstones_mock: Mock,
+        ):
+            other_user = User(id=2, login="other_user", password="password")
+            get_many_mock.return_value = [None, None, None]
+            get_users_mock.side_effect = [[user_db_fixture], [other_user]]
+
+            users = await UserService.get_users([1, 2, 3])
+            assert users == [user_db_fixture, other_user, None]
+
+            assert get_users_mock.await_args_list == [
+                call([1, 2, 3]),
+                call([2, 3], primary=True),
+            ]
+            set_many_mock.assert_awaited_once_with(
+                {"Users:1": user_db_fixture.dict(), "Users:2": other_user.dict()}
+            )
+            tombstones_mock.set.assert_awaited_once_with(["Users:3"])
+
     class TestUpdateUser:
         @pytest.mark.asyncio()
-        @patch(f"{caching_service_path}.delete_key")
+        @patch(f"{caching_service_path}.replace_value")
         @patch(f"{user_db_service_path}.update_user")
-        @patch(f"{user_db_service_path}.get_user")
         async def test_update_user_successfully(
             self,
-            get_user_mock: Mock,
-            update_user_mock: Mock,
-            delete_key_mock: AsyncMock,
+            update_user_mock: AsyncMock,
+            replace_value_mock: AsyncMock,
             user_db_fixture: User,
         ):
-            get_user_mock.return_value = user_db_fixture
             user_db_fixture.name = "new_name"
             update_user_mock.return_value = user_db_fixture
 
             user = await UserService.update_user(1, name="new_name")
             assert user == user_db_fixture
 
-            get_user_mock.assert_called_with(1)
-            update_user_mock.assert_called_with(user_db_fixture, None, "new_name")
-            delete_key_mock.assert_has_calls(
-                [
-                    call(f"Users:1-test_user"),
-                    call(f"Users:1-None"),
-                    call(f"Users:None-test_user"),
-                ]
+            update_user_mock.assert_awaited_once_with(1, None, "new_name")
+            replace_value_mock.assert_awaited_once_with(
+                "Users:1", user_db_fixture.dict()
             )
 
         @pytest.mark.asyncio()
-        @patch(f"{caching_service_path}.delete_key")
+        @patch(f"{caching_service_path}.replace_value")
+        @patch(f"{hasher_service_path}.hash_password")
         @patch(f"{user_db_service_path}.update_user")
-        @patch(f"{user_db_service_path}.get_user")
-        async def test_update_user_user_does_not_exist_error(
+        async def test_update_user_password_is_hashed(
             self,
-            get_user_mock: Mock,
-            update_user_mock: Mock,
-            delete_key_mock: AsyncMock,
+            update_user_mock: AsyncMock,
+            hash_password_mock: AsyncMock,
+            replace_value_mock: AsyncMock,
             user_db_fixture: User,
         ):
-            get_user_mock.return_value = None
+            hash_password_mock.return_value = "hashed_password"
+            update_user_mock.return_value = user_db_fixture
+
+            await UserService.update_user(1, password="new_password")
+
+            hash_password_mock.assert_awaited_with("new_password")
+            update_user_mock.assert_awaited_once_with(1, "hashed_password", None)
+
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.replace_value")
+        @patch(f"{user_db_service_path}.update_user")
+        async def test_update_user_user_does_not_exist_error(
+            self,
+            update_user_mock: AsyncMock,
+            replace_value_mock: AsyncMock,
+        ):
+            update_user_mock.return_value = None
 
             with pytest.raises(UserDoesNotExistError):
                 await UserService.update_user(1, name="new_name")
 
-            get_user_mock.assert_called_with(1)
-            update_user_mock.assert_not_called()
-            delete_key_mock.assert_not_called()
+            update_user_mock.assert_awaited_once_with(1, None, "new_name")
+            replace_value_mock.assert_not_called()
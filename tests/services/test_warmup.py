@@ -0,0 +1,131 @@
+from unittest.mock import AsyncMock, call, patch
+
+import pytest
+
+from services.warmup import WarmupService
+
+user_service_path = "services.warmup.UserService"
+caching_service_path = "services.warmup.CachingService"
+
+
+class TestWarmupService:
+    class TestGetUserIds:
+        @pytest.mark.asyncio()
+        @patch(f"{caching_service_path}.get_top_members")
+        async def test_get_hot_user_ids(self, get_top_members_mock: AsyncMock):
+            get_top_members_mock.return_value = [b"3", b"1"]
+
+            assert await WarmupService.get_user_ids("hot", 2) == [3, 1]
+            get_top_members_mock.assert_awaited_once_with("Users:hot", 2)
+
+        @pytest.mark.asyncio()
+        @patch("services.warmup.UserDBService.get_recent_user_ids")
+        async def test_get_recent_user_ids(self, get_recent_user_ids_mock: AsyncMock):
+            get_recent_user_ids_mock.return_value = [3, 2]
+
+            assert await WarmupService.get_user_ids("recent", 2) == [3, 2]
+
+    class TestWarmUpUsers:
+        @pytest.mark.asyncio()
+        @patch("services.warmup.asyncio.sleep")
+        @patch(f"{user_service_path}.get_users")
+        async def test_users_are_loaded_in_rate_limited_batches(
+            self, get_users_mock: AsyncMock, sleep_mock: AsyncMock
+        ):
+            get_users_mock.side_effect = lambda ids: [
+                None if i == 2 else i for i in ids
+            ]
+
+            found = await WarmupService.warm_up_users([1, 2, 3, 4, 5], rate=2)
+
+            assert found == 4
+            assert get_users_mock.await_args_list == [
+                call([1, 2]),
+                call([3, 4]),
+                call([5]),
+            ]
+            # a batch of 2 users takes a second at the rate of 2 users per second
+            assert sleep_mock.await_args_list[0].args[0] == pytest.approx(1, 0.1)
+
+    class TestWarmUpOncePerDeploy:
+        @pytest.fixture(autouse=True)
+        def get_value_mock(self) -> AsyncMock:
+            """No warm-up is done unless a test says otherwise"""
+            with patch(f"{caching_service_path}.get_value") as get_value_mock:
+                get_value_mock.return_value = None
+                yield get_value_mock
+
+        @pytest.mark.asyncio()
+        @patch("services.warmup.WarmupService.warm_up")
+        @patch(f"{caching_service_path}.acquire_lock")
+        async def test_warm_up_is_skipped_without_lock(
+            self, acquire_lock_mock: AsyncMock, warm_up_mock: AsyncMock
+        ):
+            acquire_lock_mock.return_value = None
+
+            await WarmupService.warm_up_once_per_deploy()
+
+            warm_up_mock.assert_not_awaited()
+
+        @pytest.mark.asyncio()
+        @patch("services.warmup.WarmupService.warm_up")
+        @patch(f"{caching_service_path}.acquire_lock")
+        async def test_warm_up_is_skipped_after_warm_up(
+            self,
+            acquire_lock_mock: AsyncMock,
+            warm_up_mock: AsyncMock,
+            get_value_mock: AsyncMock,
+        ):
+            get_value_mock.return_value = 1
+
+            await WarmupService.warm_up_once_per_deploy()
+
+            get_value_mock.assert_awaited_once_with("Warmup:done")
+            acquire_lock_mock.assert_not_awaited()
+            warm_up_mock.assert_not_awaited()
+
+        @pytest.mark.asyncio()
+        @patch("services.warmup.config.WARMUP_REPEAT_INTERVAL", 600)
+        @patch("services.warmup.WarmupService.warm_up")
+        @patch(f"{caching_service_path}.set_value")
+        @patch(f"{caching_service_path}.release_lock")
+        @patch(f"{caching_service_path}.acquire_lock")
+        async def test_warm_up_is_marked_done(
+            self,
+            acquire_lock_mock: AsyncMock,
+            release_lock_mock: AsyncMock,
+            set_value_mock: AsyncMock,
+            warm_up_mock: AsyncMock,
+        ):
+            acquire_lock_mock.return_value = "token"
+
+            await WarmupService.warm_up_once_per_deploy()
+
+            warm_up_mock.assert_awaited_once()
+            set_value_mock.assert_awaited_once_with("Warmup:done", 1, 600)
+            release_lock_mock.assert_awaited_once_with("warmup", "token")
+
+        @pytest.mark.asyncio()
+        @patch("services.warmup.WarmupService.warm_up")
+        @patch(f"{caching_service_path}.set_value")
+        @patch(f"{caching_service_path}.release_lock")
+        @patch(f"{caching_service_path}.acquire_lock")
+        async def test_lock_is_released_after_failed_warm_up(
+            self,
+            acquire_lock_mock: AsyncMock,
+            release_lock_mock: AsyncMock,
+            set_value_mock: AsyncMock,
+            warm_up_mock: AsyncMock,
+        ):
+            acquire_lock_mock.return_value = "token"
+            warm_up_mock.side_effect = ConnectionError
+
+            with patch("services.warmup.config.WARMUP_USERS", 1000), patch(
+                "services.warmup.config.WARMUP_RATE", 100
+            ), patch("services.warmup.config.WARMUP_LOCK_MARGIN", 30):
+                await WarmupService.warm_up_once_per_deploy()
+
+            acquire_lock_mock.assert_awaited_once_with("warmup", 40)
+            # the next starting worker warms up
+            set_value_mock.assert_not_awaited()
+            release_lock_mock.assert_awaited_once_with("warmup", "token")
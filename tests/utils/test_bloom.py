@@ -0,0 +1,30 @@
+from utils.bloom import BloomFilter
+
+
+class TestBloomFilter:
+    def test_added_items_are_contained(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(i)
+            bloom.add(f"login_{i}")
+
+        assert all(i in bloom for i in range(1000))
+        assert all(f"login_{i}" in bloom for i in range(1000))
+        assert bloom.count == 2000
+
+    def test_false_positive_rate_at_capacity(self):
+        bloom = BloomFilter(10000, 0.01)
+        for i in range(10000):
+            bloom.add(i)
+
+        false_positives = sum(i in bloom for i in range(10000, 110000))
+        assert false_positives / 100000 < 0.02
+        assert abs(bloom.false_positive_rate - 0.01) < 0.002
+
+    def test_size(self):
+        bloom = BloomFilter(100000, 0.01)
+
+        # about 9.6 bits and 7 hashes per item at 1%
+        assert bloom.memory_bytes == 119814
+        assert bloom.hashes == 7
+        assert bloom.false_positive_rate == 0
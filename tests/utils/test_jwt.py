@@ -0,0 +1,79 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+from fastapi import HTTPException
+from fastapi_jwt_auth import AuthJWT
+from fastapi_jwt_auth.exceptions import AuthJWTException
+
+from utils.jwt import VerifiedTokens, check_jwt_auth_and_return_user_id, verified_tokens
+
+
+def make_authorize(token: str) -> AuthJWT:
+    authorize = AuthJWT()
+    authorize._token = token
+    return authorize
+
+
+class TestCheckJwtAuth:
+    def test_verified_token_is_cached(self, jwt_for_user_fixture: str):
+        assert check_jwt_auth_and_return_user_id(make_authorize(jwt_for_user_fixture))
+
+        with patch.object(AuthJWT, "jwt_required") as jwt_required_mock:
+            user_id = check_jwt_auth_and_return_user_id(
+                make_authorize(jwt_for_user_fixture)
+            )
+
+        assert user_id == 1
+        jwt_required_mock.assert_not_called()
+
+    def test_invalid_token_is_not_cached(self):
+        with pytest.raises(AuthJWTException):
+            check_jwt_auth_and_return_user_id(make_authorize("invalid.token.value"))
+
+        assert len(verified_tokens) == 0
+
+    def test_token_without_user_id_is_rejected(self):
+        token = AuthJWT().create_access_token(subject="test_user")
+
+        with pytest.raises(HTTPException):
+            check_jwt_auth_and_return_user_id(make_authorize(token))
+
+    @patch.object(AuthJWT, "_denylist_enabled", True)
+    @patch.object(
+        AuthJWT,
+        "_token_in_denylist_callback",
+        SimpleNamespace(__func__=Mock(return_value=False)),
+    )
+    def test_token_is_not_cached_with_denylist(self, jwt_for_user_fixture: str):
+        check_jwt_auth_and_return_user_id(make_authorize(jwt_for_user_fixture))
+
+        assert len(verified_tokens) == 0
+
+
+class TestVerifiedTokens:
+    def test_expired_token_is_not_returned(self):
+        tokens = VerifiedTokens(10)
+        tokens.set("token", {"exp": time.time() - 1})
+
+        assert tokens.get("token") is None
+        assert len(tokens) == 0
+
+    def test_token_without_expiration_is_not_cached(self):
+        tokens = VerifiedTokens(10)
+        tokens.set("token", {"user_id": 1})
+
+        assert tokens.get("token") is None
+
+    def test_least_recently_used_token_is_evicted(self):
+        tokens = VerifiedTokens(2)
+        exp = time.time() + 60
+        tokens.set("a", {"exp": exp})
+        tokens.set("b", {"exp": exp})
+        tokens.get("a")
+        tokens.set("c", {"exp": exp})
+
+        assert tokens.get("a") is not None
+        assert tokens.get("b") is None
+        assert tokens.get("c") is not None
@@ -0,0 +1,81 @@
+import io
+import json
+import logging
+import queue
+from unittest.mock import Mock, patch
+
+import pytest
+
+from config import Config
+from utils.logging import (
+    DroppingQueueHandler,
+    JsonFormatter,
+    SamplingFilter,
+    setup_logging,
+    stop_logging,
+)
+
+
+def make_record(level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("test", level, __file__, 1, "hello %s", ("world",), None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestSamplingFilter:
+    @patch("random.random")
+    def test_info_records_are_sampled(self, random_mock: Mock):
+        sampling_filter = SamplingFilter(0.1)
+
+        random_mock.return_value = 0.05
+        record = make_record()
+        assert sampling_filter.filter(record)
+        assert record.sample_rate == 0.1
+
+        random_mock.return_value = 0.5
+        assert not sampling_filter.filter(make_record())
+
+    def test_warnings_are_never_sampled(self):
+        assert SamplingFilter(0).filter(make_record(logging.WARNING))
+
+
+class TestDroppingQueueHandler:
+    def test_records_over_queue_size_are_dropped(self):
+        handler = DroppingQueueHandler(queue.Queue(1))
+
+        handler.handle(make_record())
+        handler.handle(make_record())
+
+        assert handler.queue.qsize() == 1
+        assert handler.dropped == 1
+
+
+class TestJsonFormatter:
+    def test_extra_fields_are_rendered(self):
+        log = json.loads(JsonFormatter().format(make_record(user_id=1)))
+
+        assert log["level"] == "INFO"
+        assert log["logger"] == "test"
+        assert log["message"] == "hello world"
+        assert log["user_id"] == 1
+
+
+class TestSetupLogging:
+    @pytest.fixture()
+    def restore_logging(self):
+        root = logging.getLogger()
+        handlers, level = root.handlers, root.level
+        yield
+        stop_logging()
+        root.handlers, root.level = handlers, level
+
+    def test_records_are_written_by_listener(self, restore_logging, config: Config):
+        stream = io.StringIO()
+        with patch("sys.stderr", stream):
+            setup_logging(config)
+        logging.getLogger("tests.logging").info("hello", extra={"user_id": 1})
+        stop_logging()
+
+        log = json.loads(stream.getvalue())
+        assert log["message"] == "hello"
+        assert log["user_id"] == 1
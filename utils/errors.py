@@ -4,3 +4,7 @@ class UserDoesNotExistError(ValueError):
 
 class UserAlreadyExistError(ValueError):
     """Base error for already existed user error"""
+
+
+class HashingQueueFullError(Exception):
+    """Base error for password hashing queue overflow error"""
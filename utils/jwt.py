@@ -1,3 +1,7 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import timedelta
 from typing import Dict, Optional, Tuple, Union
 
@@ -6,8 +10,62 @@ from fastapi.params import Depends
 from fastapi_jwt_auth import AuthJWT
 from pydantic.types import PositiveInt
 
+from config import config
+
 token_expire_time = timedelta(hours=24)
 
+Claims = Dict[str, Union[str, int, bool]]
+
+
+class VerifiedTokens:
+    """Size-bounded LRU of claims of verified tokens, each kept until its `exp`.
+
+    Tokens are keyed by their digest, so the cache holds no usable tokens.
+    Sync dependencies run in a thread pool, hence the lock.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[bytes, Claims]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Claims]:
+        key = self._digest(token)
+        with self._lock:
+            claims = self._data.get(key)
+            if claims is None:
+                return None
+            if claims["exp"] <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return claims
+
+    def set(self, token: str, claims: Claims) -> None:
+        # tokens without expiration would stay valid for as long as cached
+        if not self.maxsize or "exp" not in claims:
+            return
+        key = self._digest(token)
+        with self._lock:
+            self._data[key] = claims
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+
+verified_tokens = VerifiedTokens(config.JWT_CACHE_SIZE)
+
 
 def create_access_refresh_tokens(
     authorize: AuthJWT,
@@ -45,7 +103,11 @@ def create_access_token(
 
 
 def get_user_id_from_jwt(authorize: AuthJWT) -> Optional[PositiveInt]:
-    raw_jwt: Optional[Dict[str, Union[str, int, bool]]] = authorize.get_raw_jwt()
+    raw_jwt: Optional[Claims] = authorize.get_raw_jwt()
+    return get_user_id_from_claims(raw_jwt)
+
+
+def get_user_id_from_claims(raw_jwt: Optional[Claims]) -> Optional[PositiveInt]:
     if not raw_jwt:
         return
     user_id = raw_jwt.get("user_id")
@@ -54,11 +116,30 @@ def get_user_id_from_jwt(authorize: AuthJWT) -> Optional[PositiveInt]:
     return user_id
 
 
-def check_jwt_auth_and_return_user_id(authorize: AuthJWT = Depends()) -> PositiveInt:
-    """Check JWT auth and return user_id if it successfully extracts from JWT"""
+def get_verified_claims(authorize: AuthJWT) -> Optional[Claims]:
+    """Verify access token of the request, once per token while it is cached"""
+    # only tokens from headers are cached, revoked tokens must be checked always
+    token: Optional[str] = authorize._token
+    cacheable = token and not (
+        authorize._denylist_enabled and "access" in authorize._denylist_token_checks
+    )
+    if cacheable:
+        claims = verified_tokens.get(token)
+        if claims is not None:
+            return claims
+
     authorize.jwt_required()
+    claims = authorize.get_raw_jwt()
+    if cacheable and claims:
+        verified_tokens.set(token, claims)
+    return claims
+
 
-    user_id: Optional[PositiveInt] = get_user_id_from_jwt(authorize)
+def check_jwt_auth_and_return_user_id(authorize: AuthJWT = Depends()) -> PositiveInt:
+    """Check JWT auth and return user_id if it successfully extracts from JWT"""
+    user_id: Optional[PositiveInt] = get_user_id_from_claims(
+        get_verified_claims(authorize)
+    )
     if not user_id:
         raise HTTPException(403, detail="Not authenticated")
 
@@ -0,0 +1,120 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config import Config
+
+# attributes of every LogRecord, the other attributes are fields passed in `extra`
+RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Hands records over to the writer thread, never blocking the caller.
+
+    Records are formatted by the writer thread, so a log call on the event
+    loop costs only creating the record and putting it into the queue.
+    """
+
+    def __init__(self, queue_: queue.Queue):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the record stays in this process, so it needs no pickling
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """Passes the share of INFO and lower records, all of the higher ones"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        if random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        log = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        log.update(
+            (key, value)
+            for key, value in record.__dict__.items()
+            if key not in RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            log["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(log, default=str)
+
+
+def setup_logging(config: Config) -> QueueListener:
+    """Route all records through a queue to a writer thread of this process"""
+    global _listener
+    stop_logging()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if config.LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+
+    log_queue = queue.Queue(config.LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.handlers = [DroppingQueueHandler(log_queue)]
+    root.setLevel(config.LOG_LEVEL)
+
+    # uvicorn loggers write to the queue through the root logger as well,
+    # without any handler uvicorn doesn't even build access log records
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.handlers = []
+        logger.propagate = True
+    logging.getLogger("uvicorn.access").propagate = config.ACCESS_LOG
+
+    for name, rate in config.LOG_SAMPLE_RATES.items():
+        logger = logging.getLogger(name)
+        logger.filters = [
+            f for f in logger.filters if not isinstance(f, SamplingFilter)
+        ]
+        logger.addFilter(SamplingFilter(rate))
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def stop_logging() -> None:
+    """Write out records left in the queue and stop the writer thread"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None